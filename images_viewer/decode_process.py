@@ -0,0 +1,112 @@
+"""
+Image decoding that also runs in the decode processes of DecodeProcessPool.
+Processes are spawned from a plain Python interpreter outside of QGIS: this module must only import
+the standard library and PIL, importing Qt or QGIS here would fail in the processes.
+"""
+
+import io
+import os
+import re
+from multiprocessing import shared_memory
+
+from PIL import Image as PILImage
+
+XMP_JPEG_HEADER = b"http://ns.adobe.com/xap/1.0/\x00"
+XMP_EXIF_TAG = 0x02BC  # XMLPacket, also the TIFF tag holding XMP
+GPANO_PROJECTION = re.compile(rb"GPano:ProjectionType(?:\s*=\s*[\"']|>)\s*(\w*)")
+
+# modes rebuilt as is from their raw bytes, others (palette, LAB...) are converted to RGBA before transfer
+RAW_MODES = ("1", "L", "LA", "RGB", "RGBA", "CMYK", "I", "I;16", "F")
+# pixels go through shared memory on POSIX, on Windows the segment would be gone once the process closes it
+USE_SHARED_MEMORY = os.name == "posix"
+
+
+def xmp_packet(image) -> bytes:
+    """
+    XMP metadata of an opened image, read from what PIL parsed with the header: JPEG APP1 segments,
+    PNG iTXt, WebP chunks, TIFF tags and the EXIF XMLPacket tag. Returns b"" if there is none.
+    """
+    for key in ("xmp", "XML:com.adobe.xmp"):
+        value = image.info.get(key)
+        if value:
+            return value.encode("utf-8") if isinstance(value, str) else value
+    for marker, segment in getattr(image, "applist", []):  # JPEG, for Pillow versions without info["xmp"]
+        if marker == "APP1" and segment.startswith(XMP_JPEG_HEADER):
+            return segment[len(XMP_JPEG_HEADER) :]
+    tags = getattr(image, "tag_v2", None)  # TIFF
+    value = tags.get(XMP_EXIF_TAG) if tags is not None else None
+    if not value and "exif" in image.info:
+        value = image.getexif().get(XMP_EXIF_TAG)
+    if isinstance(value, str):
+        value = value.encode("utf-8")
+    return value or b""
+
+
+def gpano_projection(xmp: bytes):
+    """GPano:ProjectionType of the XMP packet, "" if GPano has no projection, None if there is no GPano data"""
+    if b"GPano" not in xmp:
+        return None
+    match = GPANO_PROJECTION.search(xmp)
+    return match.group(1).decode("ascii").lower() if match else ""
+
+
+def is_panorama(image) -> bool:
+    """From the header of an opened image: GPano metadata if present, otherwise equirectangular images are 2:1"""
+    projection = gpano_projection(xmp_packet(image))
+    if projection is not None:
+        return projection in ("equirectangular", "")
+    width, height = image.size
+    return abs(width - 2 * height) <= width * 0.02
+
+
+def open_image(source):
+    """Open source, the bytes of an image or the path of an image file, only the header is read"""
+    return PILImage.open(source if isinstance(source, str) else io.BytesIO(source))
+
+
+def reduce_image(image, target_size):
+    """Decode the image at the lowest resolution that fits in target_size, this loads the pixels"""
+    # JPEG only: let the decoder scale by 1/2, 1/4 or 1/8 while decoding, no-op for other formats
+    image.draft(image.mode, target_size)
+    image.thumbnail(target_size)  # in place, keeps the aspect ratio and never upscales
+    return image
+
+
+def decode_reduced(source, target_size, panorama_size):
+    """
+    Runs in a decode process: open source, reduce it to target_size (panorama_size for 360 images) and hand the
+    pixels back. Returns (mode, size, is_360, pixels), pixels are the name of a shared memory segment the caller
+    must unlink, or the bytes themselves where shared memory is not used.
+    """
+    image = open_image(source)
+    is_360 = is_panorama(image)
+    image = reduce_image(image, panorama_size if is_360 else target_size)
+    if image.mode not in RAW_MODES:
+        image = image.convert("RGBA")
+
+    pixels = image.tobytes()
+    if not USE_SHARED_MEMORY or not pixels:
+        return image.mode, image.size, is_360, pixels
+
+    segment = shared_memory.SharedMemory(create=True, size=len(pixels))
+    segment.buf[: len(pixels)] = pixels
+    name = segment.name
+    segment.close()  # the caller attaches by name, copies and unlinks
+    return image.mode, image.size, is_360, (name, len(pixels))
+
+
+def image_from_result(result):
+    """Rebuild the PIL image returned by decode_reduced in the calling process"""
+    mode, size, is_360, pixels = result
+    if isinstance(pixels, tuple):
+        name, length = pixels
+        segment = shared_memory.SharedMemory(name=name)
+        try:
+            pixels = bytes(segment.buf[:length])
+        finally:
+            segment.close()
+            segment.unlink()
+
+    image = PILImage.frombytes(mode, size, pixels)
+    image.info["is_360"] = is_360
+    return image
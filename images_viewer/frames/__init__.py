@@ -4,3 +4,4 @@ Images Viewer Frames Module
 
 from .children_feature_frame import ChildrenFeatureFrame
 from .feature_frame import FeatureFrame
+from .frame_pool import FramePool
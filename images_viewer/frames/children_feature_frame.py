@@ -2,11 +2,18 @@ from functools import partial
 from typing import List
 
 from PIL import Image as PILImage
-from PyQt5.QtCore import QSize
-from PyQt5.QtWidgets import QToolBar
-from qgis.core import QgsExpression, QgsExpressionContext, QgsFeature
-
-from images_viewer.utils import ImageFactory, create_tool_button
+from PyQt5.QtCore import QSize, Qt
+from PyQt5.QtWidgets import QLabel, QSizePolicy, QToolBar
+from qgis.core import QgsExpression, QgsExpressionContext, QgsFeature, QgsMessageLog
+
+from images_viewer.utils import (
+    CHILDREN_DATA_CACHE_CAPACITY,
+    CHILDREN_PRIORITY,
+    ChildrenDataWorker,
+    LRUCache,
+    create_tool_button,
+    image_bytes,
+)
 
 from .feature_frame import FeatureFrame
 
@@ -23,13 +30,19 @@ class ChildrenFeatureFrame(FeatureFrame):
         image_field="",
         field_type=None,
         children: List[QgsFeature] = [],
+        thumbnail_size=None,
+        disk_cache=None,
+        worker_pool=None,
         parent=None,
     ):
-        super().__init__(iface, canvas, feature_layer, feature, feature_title, parent)
+        super().__init__(
+            iface, canvas, feature_layer, feature, feature_title, image_field, field_type, worker_pool, parent
+        )
 
-        self.image_field = image_field
-        self.field_type = field_type
         self.children_features = children
+        self.children_layer = children_layer
+        self.thumbnail_size = thumbnail_size
+        self.disk_cache = disk_cache
 
         display_expression = children_layer.displayExpression()
         self.child_title_expression = QgsExpression(display_expression)
@@ -38,25 +51,51 @@ class ChildrenFeatureFrame(FeatureFrame):
         self.prevButton = None
         self.nextButton = None
 
+        # child images are loaded in a background worker, a few of them are kept to switch back and forth
+        self.children_data_cache = LRUCache(CHILDREN_DATA_CACHE_CAPACITY)
+        self.children_loading = set()  # indexes being loaded
+        # bumped when the frame is bound to another feature, results of workers started before are dropped
+        self.generation = 0
+        self.child_title_label = None
+
     def buildUI(self, data: PILImage):
         # we get first time data from ouside, so that it can be generated outside of main thread
-        self.frame_layout.addWidget(self.createTitleLabel(self.feature_title))
+        self.data = data
+        self.title_label = self.createTitleLabel(self.feature_title)
+        self.frame_layout.addWidget(self.title_label)
 
         child_feature = self.children_features[0]
-        context = QgsExpressionContext()
-        context.setFeature(child_feature)
-        child_feature_title = self.child_title_expression.evaluate(context)
-        self.frame_layout.addWidget(
-            self.createTitleLabel(child_feature_title, 12, "#E9E7E3", 30)
-        )  # to do make it subfeature title
+        self.child_title_label = self.createTitleLabel(self._child_title(child_feature), 12, "#E9E7E3", 30)
+        self.frame_layout.addWidget(self.child_title_label)
 
-        self.frame_layout.addWidget(self.createImageWidget(data))
+        self.children_data_cache.put(0, data)
+        self.image_widget = self.createImageWidget(data, child_feature)
+        self.frame_layout.addWidget(self.image_widget)
         self.toolbar_layout.addWidget(self.createFeatureToolBar())
         self.toolbar_layout.addStretch()
         self.toolbar_layout.addWidget(self._createChildrenToolBar())
         self.frame_layout.addLayout(self.toolbar_layout)
 
-    # def getChildTitle(self, )
+    def bind(self, feature, feature_title, data: PILImage, children=None):
+        """Extends FeatureFrame.bind, the children of the previous feature are forgotten"""
+        self.generation += 1
+        self.children_features = children
+        self.current_child_index = 0
+        self.children_data_cache.clear()
+        self.children_loading.clear()
+        self.children_data_cache.put(0, data)
+
+        self.child_title_label.setText(str(self._child_title(children[0])))
+        self.prevButton.setEnabled(False)
+        self.nextButton.setEnabled(len(children) > 1)
+        super().bind(feature, feature_title, data)
+        if self.isVisible():
+            self._load_children(0)
+
+    def _child_title(self, child_feature):
+        context = QgsExpressionContext()
+        context.setFeature(child_feature)
+        return self.child_title_expression.evaluate(context)
 
     def _createChildrenToolBar(self) -> QToolBar:
         self.prevButton = create_tool_button("mActionArrowLeft.svg", "Previous", partial(self._switch_child, -1))
@@ -78,32 +117,78 @@ class ChildrenFeatureFrame(FeatureFrame):
         self.prevButton.setEnabled(new_index > 0)
         self.nextButton.setEnabled(new_index < len(self.children_features) - 1)
 
-        child_feature = self.children_features[new_index]
-
-        context = QgsExpressionContext()
-        context.setFeature(child_feature)
-        child_feature_title = self.child_title_expression.evaluate(context)
-        new_child_title_widget = self.createTitleLabel(child_feature_title, 12, "#E9E7E3")
-        old_child_title_widget = self.frame_layout.itemAt(1).widget()
-        self.frame_layout.replaceWidget(old_child_title_widget, new_child_title_widget)
-
-        data = self._get_child_image_data(child_feature)
-        new_image_widget = self.createImageWidget(data)
-        old_image_widget = self.frame_layout.itemAt(2).widget()
-        self.frame_layout.replaceWidget(old_image_widget, new_image_widget)
-
+        self.child_title_label.setText(str(self._child_title(self.children_features[new_index])))
         self.current_child_index = new_index
 
-        # Delete the old widget
-        old_image_widget.setParent(None)
-        old_image_widget.deleteLater()
-        old_child_title_widget.setParent(None)
-        old_child_title_widget.deleteLater()
-
-    def _get_child_image_data(self, feature):
-        data = None
-        field_content = feature[self.image_field]
-
-        data = ImageFactory.extract_data(field_content, self.field_type)
-
-        return data
+        if self.children_data_cache.keyExist(new_index):
+            self._set_child_image(new_index, self.children_data_cache.get(new_index))
+        else:
+            self.setImageWidget(self._create_message_label("Loading..."))
+        self._load_children(new_index)
+
+    def memoryUsage(self) -> int:
+        """Extends FeatureFrame.memoryUsage with the cached child images"""
+        return super().memoryUsage() + sum(image_bytes(d) for d in self.children_data_cache.values() if d)
+
+    def showEvent(self, event):
+        """Prefetch the neighbouring children as soon as the frame is shown"""
+        super().showEvent(event)
+        self._load_children(self.current_child_index)
+
+    def _load_children(self, index):
+        """Load the child at index and its neighbours in the background, if they are not cached or loading"""
+        indexes = [
+            i
+            for i in (index, index + 1, index - 1)
+            if 0 <= i < len(self.children_features)
+            and i not in self.children_loading
+            and not self.children_data_cache.keyExist(i)
+        ]
+        if not indexes:
+            return
+
+        self.children_loading.update(indexes)
+        worker = ChildrenDataWorker(
+            [(i, self.children_features[i]) for i in indexes],
+            self.children_layer.id(),
+            self.image_field,
+            self.field_type,
+            self.thumbnail_size,
+            self.disk_cache,
+        )
+        worker.data_ready.connect(partial(self._on_child_data_ready, self.generation))
+        worker.data_failed.connect(partial(self._on_child_data_failed, self.generation))
+        worker.finished.connect(worker.deleteLater)
+        self.worker_pool.start(worker, CHILDREN_PRIORITY)
+
+    def _on_child_data_ready(self, generation, index, data):
+        if generation != self.generation:  # the frame shows another feature now
+            return
+        self.children_loading.discard(index)
+        self.children_data_cache.put(index, data)
+        if index == self.current_child_index:
+            self._set_child_image(index, data)
+
+    def _on_child_data_failed(self, generation, index, error):
+        if generation != self.generation:
+            return
+        self.children_loading.discard(index)
+        QgsMessageLog.logMessage(
+            f"Extracting Data: Feature Id: {self.children_features[index].id()} Error: {error}",
+            "Images Viewer",
+            level=1,
+        )
+        if index == self.current_child_index:
+            self.setImageWidget(self._create_message_label("Unable to load image. See logs for details."))
+
+    def _set_child_image(self, index, data):
+        if data is None:
+            self.setImageWidget(self._create_message_label("No image"))
+        else:
+            self.setImage(data, self.children_features[index])
+
+    def _create_message_label(self, text) -> QLabel:
+        label = QLabel(text)
+        label.setAlignment(Qt.AlignCenter)
+        label.setSizePolicy(QSizePolicy.Expanding, QSizePolicy.Expanding)
+        return label
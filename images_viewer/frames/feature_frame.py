@@ -1,3 +1,5 @@
+from functools import partial
+
 from PIL import Image as PILImage
 from PyQt5.QtCore import QSize, Qt
 from PyQt5.QtWidgets import (
@@ -9,11 +11,29 @@ from PyQt5.QtWidgets import (
     QVBoxLayout,
 )
 
-from images_viewer.utils import ImageFactory, create_tool_button
+from images_viewer.utils import (
+    FRAME_SIZE,
+    VISIBLE_PRIORITY,
+    FullImageWorker,
+    ImageFactory,
+    create_tool_button,
+)
+from images_viewer.widgets import Texture
 
 
 class FeatureFrame(QFrame):
-    def __init__(self, iface, canvas, feature_layer, feature, feature_title="", parent=None):
+    def __init__(
+        self,
+        iface,
+        canvas,
+        feature_layer,
+        feature,
+        feature_title="",
+        image_field="",
+        field_type=None,
+        worker_pool=None,
+        parent=None,
+    ):
         super().__init__(parent)
 
         self.iface = iface
@@ -23,9 +43,14 @@ class FeatureFrame(QFrame):
         self.feature = feature
         self.feature_title = feature_title
 
+        # needed to load the full resolution image on demand
+        self.image_field = image_field
+        self.field_type = field_type
+        self.worker_pool = worker_pool  # WorkerPool loading images off the GUI thread
+
         self.setFrameStyle(QFrame.Box | QFrame.Plain)
         self.setStyleSheet("QFrame {color: #BEBEBE;}")
-        self.setMinimumSize(400, 600)
+        self.setMinimumSize(*FRAME_SIZE)
 
         self.frame_layout = QVBoxLayout(self)
         self.frame_layout.setContentsMargins(0, 0, 0, 0)  # (left, top, right, bottom)
@@ -34,14 +59,50 @@ class FeatureFrame(QFrame):
         self.toolbar_layout = QHBoxLayout()
         self.toolbar_layout.setContentsMargins(0, 0, 0, 0)  # (left, top, right, bottom)
 
+        self.title_label = None
+        self.image_widget = None
+        self.data = None  # image data the frame was built or bound with, compared by the frame pool
+
     def buildUI(self, data: PILImage):
-        self.frame_layout.addWidget(self.createTitleLabel(self.feature_title))
-        self.frame_layout.addWidget(self.createImageWidget(data))
+        self.data = data
+        self.title_label = self.createTitleLabel(self.feature_title)
+        self.frame_layout.addWidget(self.title_label)
+        self.image_widget = self.createImageWidget(data)
+        self.frame_layout.addWidget(self.image_widget)
         self.toolbar_layout.addWidget(self.createFeatureToolBar())
         self.toolbar_layout.addStretch()
         self.frame_layout.addSpacing(2)
         self.frame_layout.addLayout(self.toolbar_layout)
 
+    def bind(self, feature, feature_title, data: PILImage, children=None):
+        """Show another feature in the built frame, used by the virtualized grid to reuse frames"""
+        self.feature = feature
+        self.feature_title = feature_title
+        self.data = data
+        self.title_label.setText(str(feature_title))
+        self.setImage(data, feature)
+
+    def setImage(self, data: PILImage, feature=None):
+        """
+        Show data in the image widget, the widget and its GL context are reused if it is of the right kind
+        (static vs 360) otherwise it is replaced.
+        """
+        if feature is None:
+            feature = self.feature
+        if type(self.image_widget) is ImageFactory.widget_class(data):
+            self.image_widget.setImage(data, partial(self.loadFullImage, feature))
+        else:
+            self.setImageWidget(self.createImageWidget(data, feature))
+
+    def setImageWidget(self, new_image_widget):
+        """Replace the image widget (or message label) by new_image_widget"""
+        self.frame_layout.replaceWidget(self.image_widget, new_image_widget)
+
+        # Delete the old widget
+        self.image_widget.setParent(None)
+        self.image_widget.deleteLater()
+        self.image_widget = new_image_widget
+
     def createTitleLabel(self, text: str, font_size: int = 13, bg_color: str = "white", min_height=35) -> QLabel:
         title_label = QLabel()
         title_label.setText(str(text))
@@ -54,12 +115,36 @@ class FeatureFrame(QFrame):
 
         return title_label
 
-    def createImageWidget(self, data: PILImage):
-        imageWidget = ImageFactory.create_widget(data)
+    def createImageWidget(self, data: PILImage, feature=None):
+        """feature is the feature the image data belongs to, defaults to self.feature"""
+        if feature is None:
+            feature = self.feature
+        imageWidget = ImageFactory.create_widget(data, partial(self.loadFullImage, feature))
         imageWidget.setSizePolicy(QSizePolicy.Expanding, QSizePolicy.Expanding)
 
         return imageWidget
 
+    def loadFullImage(self, feature, on_ready, box):
+        """
+        Load the image of the feature reduced to fit in box in the worker pool, the download and decode can take
+        seconds. on_ready(image) is called in the GUI thread with the image, or with None if it can't be loaded.
+        """
+        worker = FullImageWorker(
+            feature[self.image_field], self.field_type, feature.id(), box, Texture.max_size or None
+        )
+        worker.image_ready.connect(on_ready)
+        worker.finished.connect(worker.deleteLater)
+        self.worker_pool.start(worker, VISIBLE_PRIORITY)
+
+    def memoryUsage(self) -> int:
+        """Estimated bytes held by the frame, this is mostly the image widget's pixels and texture"""
+        usage = 0
+        for i in range(self.frame_layout.count()):
+            widget = self.frame_layout.itemAt(i).widget()
+            if hasattr(widget, "memoryUsage"):
+                usage += widget.memoryUsage()
+        return usage
+
     def createFeatureToolBar(self) -> QToolBar:
         toolbar = QToolBar()
         toolbar.setIconSize(QSize(20, 20))
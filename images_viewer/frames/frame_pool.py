@@ -0,0 +1,54 @@
+class FramePool:
+    """
+    Fixed set of frames reused from page to page instead of a frame per feature.
+    A frame still showing a feature of the new grid keeps it (and its texture), the others are rebound to the
+    new features, so the number of widgets and GL contexts does not grow with the pages visited.
+    """
+
+    def __init__(self):
+        self.bound = {}  # feature id: frame of the current grid
+        self.spare = []  # frames free to be rebound
+
+    def arrange(self, f_ids, frame_class):
+        """
+        Start a grid showing f_ids with frames of frame_class, frames of another class are deleted.
+        Frames are then handed out by frame, in any order.
+        """
+        f_ids = set(f_ids)
+        bound, self.bound = self.bound, {}
+        for f_id, frame in bound.items():
+            if f_id in f_ids:
+                self.bound[f_id] = frame
+            else:
+                self.spare.append(frame)
+        for frame in [frame for frame in self.spare if type(frame) is not frame_class]:
+            self.spare.remove(frame)
+            frame.deleteLater()
+        for f_id, frame in list(self.bound.items()):
+            if type(frame) is not frame_class:
+                del self.bound[f_id]
+                frame.deleteLater()
+
+    def frame(self, f_id, create):
+        """
+        Frame for f_id: the one already showing it, else a spare one, else a new one made by create().
+        Returns (frame, created), a created frame still has to be built, the others may have to be rebound.
+        """
+        frame = self.bound.get(f_id)
+        if frame is not None:
+            return frame, False
+        if self.spare:
+            frame = self.bound[f_id] = self.spare.pop()
+            return frame, False
+        frame = self.bound[f_id] = create()
+        return frame, True
+
+    def __len__(self):
+        """Number of frames in the pool, their pixels are counted by the data cache and their textures by Texture"""
+        return len(self.bound) + len(self.spare)
+
+    def clear(self):
+        for frame in list(self.bound.values()) + self.spare:
+            frame.deleteLater()
+        self.bound = {}
+        self.spare = []
@@ -21,11 +21,14 @@
 """
 import os.path
 
-from qgis.PyQt.QtCore import QCoreApplication, QSettings, QTranslator
+from qgis.core import QgsApplication, QgsVectorLayer
+from qgis.gui import QgsExpressionBuilderDialog
+from qgis.PyQt.QtCore import QCoreApplication, QSettings, QTranslator, QVariant
 from qgis.PyQt.QtGui import QIcon
-from qgis.PyQt.QtWidgets import QAction
+from qgis.PyQt.QtWidgets import QAction, QInputDialog, QMessageBox
 
 from .images_viewer_dialog import ImagesViewerDialog
+from .utils import FRAME_SIZE, DecodeProcessPool, PrethumbnailTask
 
 current_dir = os.path.dirname(os.path.abspath(__file__))
 icon_path = os.path.join(current_dir, "resources/icon.svg")
@@ -62,6 +65,7 @@ class ImagesViewerPlugin:
         # Check if plugin was started the first time in current QGIS session
         # Must be set in initGui() to survive plugin reloads
         self.first_start = None
+        self.prethumbnail_task = None  # kept referenced while the task manager runs it
 
     # noinspection PyMethodMayBeStatic
     def tr(self, message):
@@ -157,6 +161,14 @@ class ImagesViewerPlugin:
         self.add_action(
             icon_path, text=self.tr("Open Images Viewer"), callback=self.run, parent=self.iface.mainWindow()
         )
+        self.add_action(
+            icon_path,
+            text=self.tr("Pre-thumbnail Layer Images..."),
+            callback=self.prethumbnail,
+            add_to_toolbar=False,
+            status_tip=self.tr("Fill the thumbnail cache with the images of the active layer in the background"),
+            parent=self.iface.mainWindow(),
+        )
 
         # will be set False in run()
         self.first_start = True
@@ -164,8 +176,11 @@ class ImagesViewerPlugin:
     def unload(self):
         """Removes the plugin menu item and icon from QGIS GUI."""
         for action in self.actions:
-            self.iface.removePluginMenu(self.tr("Open Images Viewer"), action)
+            self.iface.removePluginMenu(self.menu, action)
             self.iface.removeToolBarIcon(action)
+        if self.prethumbnail_task is not None:
+            self.prethumbnail_task.cancel()
+        DecodeProcessPool.shutdown()
 
     def run(self):
         """Run method that performs all the real work"""
@@ -176,3 +191,62 @@ class ImagesViewerPlugin:
 
         # show the dialog
         self.dlg.show()
+
+    def prethumbnail(self):
+        """Ask for the image field and the features of the active layer, then cache their thumbnails in a task"""
+        title = self.tr("Pre-thumbnail Layer Images")
+        parent = self.iface.mainWindow()
+        layer = self.iface.activeLayer()
+        if not isinstance(layer, QgsVectorLayer):
+            self.iface.messageBar().pushMessage(title, self.tr("Select a vector layer first"), 1)
+            return
+
+        fields = [f.name() for f in layer.fields() if f.type() in (QVariant.String, QVariant.ByteArray)]
+        if not fields:
+            self.iface.messageBar().pushMessage(title, self.tr("The layer has no text or binary field"), 1)
+            return
+        # default to the field the viewer used for this layer
+        viewer_field = QSettings("QGIS3 - Images Viewer", layer.name()).value("imageField", "")
+        current = fields.index(viewer_field) if viewer_field in fields else 0
+        image_field, ok = QInputDialog.getItem(parent, title, self.tr("Image field:"), fields, current, False)
+        if not ok:
+            return
+
+        scopes = [self.tr("All Features"), self.tr("Selected Features"), self.tr("Features Matching an Expression")]
+        scope, ok = QInputDialog.getItem(parent, title, self.tr("Features:"), scopes, 0, False)
+        if not ok:
+            return
+        selected_only = scope == scopes[1]
+        filter_expression = ""
+        if scope == scopes[2]:
+            expression_dialog = QgsExpressionBuilderDialog(layer, "", parent)
+            if not expression_dialog.exec_() or not expression_dialog.expressionText().strip():
+                return
+            filter_expression = expression_dialog.expressionText()
+
+        resume = False
+        checkpoint = PrethumbnailTask.savedCheckpoint(layer, image_field, filter_expression, selected_only)
+        if checkpoint is not None:
+            answer = QMessageBox.question(
+                parent,
+                title,
+                self.tr("A previous run stopped after feature {}. Resume from there?").format(checkpoint),
+                QMessageBox.Yes | QMessageBox.No | QMessageBox.Cancel,
+            )
+            if answer == QMessageBox.Cancel:
+                return
+            resume = answer == QMessageBox.Yes
+
+        # thumbnails made for the largest frames are used by the smaller ones too
+        thumbnail_size = tuple(round(d * parent.devicePixelRatioF()) for d in FRAME_SIZE)
+        field_type = layer.fields().field(image_field).type()
+        task = PrethumbnailTask(
+            self.iface, layer, image_field, field_type, thumbnail_size, filter_expression, selected_only, resume
+        )
+        task.taskCompleted.connect(self.prethumbnailEnded)
+        task.taskTerminated.connect(self.prethumbnailEnded)
+        self.prethumbnail_task = task
+        QgsApplication.taskManager().addTask(task)
+
+    def prethumbnailEnded(self):
+        self.prethumbnail_task = None
@@ -9,11 +9,16 @@ Variables should be snake_case to follow python's guidlines
 
 
 import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
 
 from PyQt5 import uic
-from PyQt5.QtCore import QSettings, QSize, QThread, QVariant
+from PyQt5.QtCore import QSettings, QSize, QTimer, QVariant
 from PyQt5.QtGui import QIcon, QPalette
+from PyQt5.QtWidgets import QComboBox, QLineEdit, QSpinBox, QToolButton
 from qgis.core import (
+    NULL,
     QgsApplication,
     QgsFields,
     QgsMessageLog,
@@ -21,15 +26,42 @@ from qgis.core import (
     QgsVectorLayer,
 )
 
-from images_viewer.frames import ChildrenFeatureFrame, FeatureFrame
+from images_viewer.frames import ChildrenFeatureFrame, FeatureFrame, FramePool
 from images_viewer.utils import (
+    BUSY_BAR_DELAY,
+    EXTENT_REFRESH_DELAY,
+    FEATURES_DATA_CACHE_BYTES,
+    FRAME_SIZES,
+    FRAMES_CACHE_BYTES,
     FRAMES_CACHE_CAPACITY,
+    GRID_COLUMNS,
+    GRID_ROWS,
+    HAS_IMAGE_INDEX,
+    IMAGE_FETCH_CONCURRENCY,
+    INCREMENTAL_REFRESH_MIN_OVERLAP,
+    PREFETCH_PAGES_AHEAD,
+    PREFETCH_PAGES_BEHIND,
+    SCROLL_LOAD_MARGIN,
+    SCROLL_LOADED_PAGES,
+    SPECULATIVE_PRIORITY,
+    VIRTUALIZED_GRID,
+    VISIBLE_PRIORITY,
     FeatureDataLRUCache,
+    FeatureIdIndex,
+    FeatureIdSet,
     FeaturesWorker,
+    ImageIndexWorker,
     PageDataWorker,
+    PageIndex,
+    PageIndexWorker,
+    PagePrefetcher,
+    ThumbnailDiskCache,
     WidgetLRUCache,
+    WorkerPool,
     create_tool_button,
+    overlap_ratio,
 )
+from images_viewer.widgets import Texture
 
 # import time
 
@@ -77,22 +109,105 @@ class ImagesViewerDialog(QtBaseClass, Ui_Dialog):
 
         self.canvas = self.iface.mapCanvas()
         self.busy_bar_count = 0
-        self.features_worker = None
-        self.feature_ids = []
-        self.page_data_worker = None
+        self.busy_bar_timer = QTimer(self)
+        self.busy_bar_timer.setSingleShot(True)
+        self.busy_bar_timer.setInterval(BUSY_BAR_DELAY)
+        self.busy_bar_timer.timeout.connect(self.showBusyBar)
+        self.features_task = None  # TaskHandle of the running FeaturesWorker
+        self.feature_ids = FeatureIdIndex()
+        self.features_extent = None  # canvas extent self.feature_ids was found for, None if it can't be patched
+        # extent changes are coalesced, panning or zooming refreshes the features once the canvas settles
+        self.extent_refresh_timer = QTimer(self)
+        self.extent_refresh_timer.setSingleShot(True)
+        self.extent_refresh_timer.setInterval(EXTENT_REFRESH_DELAY)
+        self.extent_refresh_timer.timeout.connect(self.refreshFeaturesForExtent)
+        self.page_data_task = None  # TaskHandle of the PageDataWorker of the visible page
+        self.page_data_reverse = False  # direction of that worker's scan
         self.page_ids = []
-        self.page_size = 9  # change this to conrol how many frames per page
-        self.features_none_data_cache = set()
-        self.features_broken_data_cache = set()
-        self.features_data_cache = FeatureDataLRUCache(self.page_size * 2)
-        self.features_frames_cache = WidgetLRUCache(FRAMES_CACHE_CAPACITY)
+        # grid density, a page is GRID_ROWS rows of self.columns frames
+        self.columns = int(self.default_settings.value("columns", GRID_COLUMNS))
+        self.frame_size_name = self.default_settings.value("frameSize", "Large")
+        if self.frame_size_name not in FRAME_SIZES:
+            self.frame_size_name = "Large"
+        # in continuous scroll mode pages are added to the grid as the user scrolls instead of replacing it
+        self.continuous_scroll = self.default_settings.value("continuousScroll", False, type=bool)
+        self.scroll_pages = []  # (page_start, page_ids) of the pages in the grid in continuous scroll mode
+        self.scroll_task = None  # TaskHandle of the PageDataWorker loading a page next to them
+        self.page_size = self.columns * GRID_ROWS
+        # images are decoded at the frame's size in device pixels, full resolution is loaded on zoom
+        self.thumbnail_size = tuple(round(d * self.devicePixelRatioF()) for d in FRAME_SIZES[self.frame_size_name])
+        # bitmaps of the features known to have no image or a broken one, so pages skip them without fetching
+        self.features_none_data_cache = FeatureIdSet()
+        self.features_broken_data_cache = FeatureIdSet()
+        # ids of the layer's features with a value in the image field, None until built or in relation mode
+        self.image_index = None
+        self.image_index_task = None
+        # start of every page, built from the image index or else learned while paging forward
+        self.page_index = PageIndex()
+        self.page_index_ids = None  # the feature_ids self.page_index was made for
+        self.page_index_task = None
+        self.createCaches()
+        # used instead of the frames cache by the virtualized grid, frames are rebound page after page
+        self.frame_pool = FramePool()
+        # thumbnails persist between sessions, this is not cleared by clearCaches
+        self.thumbnails_disk_cache = ThumbnailDiskCache()
+        # shared by page workers so that the number of concurrent image fetches stays bounded
+        self.fetch_executor = ThreadPoolExecutor(IMAGE_FETCH_CONCURRENCY, thread_name_prefix="ImagesViewerFetch")
+        # all features, page and children workers run in this pool instead of a thread each
+        self.worker_pool = WorkerPool()
+        self.page_prefetcher = PagePrefetcher(self.createPageWorker, self.worker_pool)
 
         self.layer.displayExpressionChanged.connect(self.handleDisplayExpressionChange)
+        # keep the image index in sync with edits, ids of new features change on commit so rebuild then
+        self.layer.attributeValueChanged.connect(self.handleAttributeValueChange)
+        self.layer.featureAdded.connect(self.handleFeatureAdded)
+        self.layer.featureDeleted.connect(self.handleFeatureDeleted)
+        self.layer.afterCommitChanges.connect(self.refreshImageIndex)
+        self.layer.afterRollBack.connect(self.refreshImageIndex)
+        # edits may move features in or out of the extent, the ids found for it can't be patched anymore
+        self.layer.geometryChanged.connect(self.handleGeometryChanged)
+        self.layer.dataChanged.connect(self.handleLayerDataChanged)
 
         # Top tool bar
-        refreshButton = create_tool_button("mActionRefresh.svg", "Refresh", self.handelHardRefresh)
+        self.refreshButton = create_tool_button("mActionRefresh.svg", "Refresh", self.handelHardRefresh)
         self.topToolBar.setIconSize(QSize(20, 20))
-        self.topToolBar.addWidget(refreshButton)
+        self.topToolBar.addWidget(self.refreshButton)
+        self.pageSpinBox = QSpinBox()
+        self.pageSpinBox.setPrefix("Page ")
+        self.pageSpinBox.setMinimum(1)
+        self.pageSpinBox.setKeyboardTracking(False)
+        self.pageSpinBox.setToolTip("Jump to page")
+        self.pageSpinBox.editingFinished.connect(lambda: self.jumpToPage(self.pageSpinBox.value() - 1))
+        self.topToolBar.addWidget(self.pageSpinBox)
+        self.featureIdLineEdit = QLineEdit()
+        self.featureIdLineEdit.setPlaceholderText("Feature id")
+        self.featureIdLineEdit.setToolTip("Jump to the page of a feature")
+        self.featureIdLineEdit.setMaximumWidth(100)
+        self.featureIdLineEdit.returnPressed.connect(self.handleFeatureIdEntered)
+        self.topToolBar.addWidget(self.featureIdLineEdit)
+        self.topToolBar.addSeparator()
+        self.columnsSpinBox = QSpinBox()
+        self.columnsSpinBox.setPrefix("Columns ")
+        self.columnsSpinBox.setRange(1, 12)
+        self.columnsSpinBox.setValue(self.columns)
+        self.columnsSpinBox.setKeyboardTracking(False)
+        self.columnsSpinBox.setToolTip("Frames per row")
+        self.columnsSpinBox.valueChanged.connect(self.handleColumnsChange)
+        self.topToolBar.addWidget(self.columnsSpinBox)
+        self.frameSizeComboBox = QComboBox()
+        self.frameSizeComboBox.addItems(list(FRAME_SIZES))
+        self.frameSizeComboBox.setCurrentText(self.frame_size_name)
+        self.frameSizeComboBox.setToolTip("Thumbnail size")
+        self.frameSizeComboBox.currentTextChanged.connect(self.handleFrameSizeChange)
+        self.topToolBar.addWidget(self.frameSizeComboBox)
+        self.continuousScrollButton = QToolButton()
+        self.continuousScrollButton.setText("Continuous Scroll")
+        self.continuousScrollButton.setToolTip("Load more rows while scrolling instead of showing one page at a time")
+        self.continuousScrollButton.setCheckable(True)
+        self.continuousScrollButton.setChecked(self.continuous_scroll)
+        self.continuousScrollButton.toggled.connect(self.handleContinuousScrollToggle)
+        self.topToolBar.addWidget(self.continuousScrollButton)
+        self.mainScrollArea.verticalScrollBar().valueChanged.connect(self.loadScrollPages)
 
         # Feature Filter
         self.featuresFilterComboBox.addItem(
@@ -111,7 +226,7 @@ class ImagesViewerDialog(QtBaseClass, Ui_Dialog):
 
         if self.layer.isSpatial():
             self.ff_combo_box_index = 0  # Start with visible
-            self.canvas.extentsChanged.connect(self.refreshFeatures)
+            self.canvas.extentsChanged.connect(self.extent_refresh_timer.start)
         else:
             for index in [0, 2]:
                 item = self.featuresFilterComboBox.model().item(index)
@@ -139,6 +254,8 @@ class ImagesViewerDialog(QtBaseClass, Ui_Dialog):
         self.next_page_start = 0
         self.previousPageButton.clicked.connect(self.displayPrevPage)
         self.nextPageButton.clicked.connect(self.displayNextPage)
+        self.previousPageButton.setVisible(not self.continuous_scroll)
+        self.nextPageButton.setVisible(not self.continuous_scroll)
 
         # Instantiate GUI
         self.relation = None
@@ -155,9 +272,54 @@ class ImagesViewerDialog(QtBaseClass, Ui_Dialog):
     def handelHardRefresh(self):
         self.abondonWorkers(True, True)
         self.clearCaches()
-        self.feature_ids = []
+        self.feature_ids = FeatureIdIndex()
+        self.refreshImageIndex()
         self.refreshFeatures()
 
+    def createCaches(self):
+        """
+        Caches sized for the grid. They are bounded by memory, the features in the grid are pinned so they are
+        never evicted (see refreshGrid), the data cache must also be able to hold the prefetched pages around them.
+        """
+        grid_size = self.page_size * (SCROLL_LOADED_PAGES if self.continuous_scroll else 1)
+        self.features_data_cache = FeatureDataLRUCache(
+            grid_size + self.page_size * (1 + PREFETCH_PAGES_AHEAD + PREFETCH_PAGES_BEHIND),
+            FEATURES_DATA_CACHE_BYTES,
+        )
+        self.features_frames_cache = WidgetLRUCache(max(FRAMES_CACHE_CAPACITY, grid_size), FRAMES_CACHE_BYTES)
+
+    def handleColumnsChange(self, columns):
+        self.columns = columns
+        self.applyGridDensity()
+
+    def handleFrameSizeChange(self, name):
+        self.frame_size_name = name
+        self.applyGridDensity()
+
+    def handleContinuousScrollToggle(self, checked):
+        self.continuous_scroll = checked
+        self.previousPageButton.setVisible(not checked)
+        self.nextPageButton.setVisible(not checked)
+        self.applyGridDensity()
+
+    def applyGridDensity(self):
+        """Rebuild the grid for the selected columns, frame size and scroll mode, starting at the same feature"""
+        self.abondonWorkers(page_data=True)
+        self.clearGrid()
+        # frames and decoded images are made for the previous size, the bitmaps of features without image still hold
+        self.features_frames_cache.clear()
+        self.frame_pool.clear()
+        self.features_data_cache.clear()
+
+        self.page_size = self.columns * GRID_ROWS
+        self.thumbnail_size = tuple(round(d * self.devicePixelRatioF()) for d in FRAME_SIZES[self.frame_size_name])
+        self.createCaches()
+        self.scroll_pages = []
+        self.refreshPageIndex()
+        if not self.features_task or self.features_task.done:  # the title counts pages, not while still counting
+            self.refreshWindowTitle()
+        self.startPageWorker(self.page_start)
+
     def handelRelationChange(self, index):
         """
         Set self.realtion to relation at current index.
@@ -186,6 +348,7 @@ class ImagesViewerDialog(QtBaseClass, Ui_Dialog):
             self.handleFieldChange("")
         else:
             self.fieldComboBox.setField(self.image_field)
+        self.refreshImageIndex()  # setField does not call handleFieldChange if the field name is the same
 
     def handleFieldChange(self, fieldName):
         self.abondonWorkers(True, True)
@@ -202,11 +365,124 @@ class ImagesViewerDialog(QtBaseClass, Ui_Dialog):
             field_index = self.filtered_fields.indexFromName(fieldName)
             field = self.filtered_fields[field_index]
             self.field_type = field.type()
+        self.refreshImageIndex()
 
         # we are not calling features refresh because we don't want to lose the current page start
         # this will be useful when a layer has images in two fields
         self.startPageWorker(self.page_start)
 
+    def refreshImageIndex(self):
+        """Rebuild the index of features with an image, pages are searched without it until it is ready"""
+        if self.image_index_task:
+            self.image_index_task.cancel()
+            self.image_index_task = None
+        self.image_index = None
+
+        self.refreshPageIndex()  # back to learning the pages until the new index is ready
+
+        # in relation mode the images are on the children layer, a parent with a child is not known to have images
+        if not HAS_IMAGE_INDEX or self.relation or not self.image_field:
+            return
+
+        image_index_worker = ImageIndexWorker(self.layer, self.image_field, self.field_type)
+        image_index_worker.index_ready.connect(partial(self.onImageIndexReady, image_index_worker))
+        image_index_worker.message_dispatched.connect(self.handleWorkersMessage)
+        image_index_worker.finished.connect(image_index_worker.deleteLater)
+        self.image_index_task = self.worker_pool.start(image_index_worker, VISIBLE_PRIORITY)
+
+    def onImageIndexReady(self, worker, image_index):
+        if not self.isCurrentWorker(self.image_index_task, worker):  # e.g. the index of the previous image field
+            return
+        self.image_index = image_index
+        self.refreshWindowTitle()
+        self.refreshPageIndex()
+
+    def refreshPageIndex(self):
+        """Find the page starts in the background, without an image index they are learned while paging"""
+        if self.page_index_task:
+            self.page_index_task.cancel()
+            self.page_index_task = None
+        self.page_index = PageIndex()
+        self.page_index_ids = self.feature_ids
+
+        if self.image_index is not None and self.feature_ids:
+            page_index_worker = PageIndexWorker(
+                self.feature_ids,
+                self.image_index,
+                self.features_none_data_cache,
+                self.features_broken_data_cache,
+                self.page_size,
+            )
+            page_index_worker.page_index_ready.connect(partial(self.onPageIndexReady, page_index_worker))
+            page_index_worker.message_dispatched.connect(self.handleWorkersMessage)
+            page_index_worker.finished.connect(page_index_worker.deleteLater)
+            self.page_index_task = self.worker_pool.start(page_index_worker, SPECULATIVE_PRIORITY)
+        self.refreshPageButtons()
+
+    def onPageIndexReady(self, worker, page_index):
+        if not self.isCurrentWorker(self.page_index_task, worker):  # queued before its worker was cancelled
+            return
+        self.page_index = page_index
+        self.refreshPageButtons()
+
+    def jumpToPage(self, page):
+        """Show page number page (0 based) if its start is known"""
+        page_start = self.page_index.pageStart(page)
+        if page_start is None or (page_start == self.page_start and self.page_ids):
+            return
+        self.startPageWorker(page_start)
+
+    def jumpToFeature(self, f_id) -> bool:
+        """Show the page with feature f_id, returns False if the feature is not in the filtered features"""
+        index = self.feature_ids.bisectLeft(f_id)
+        if index >= len(self.feature_ids) or self.feature_ids[index] != f_id:
+            return False
+        page = self.page_index.pageOf(index)
+        if page == self.page_index.pageCount() - 1 and not self.page_index.complete:
+            self.startPageWorker(index)  # past the known pages, start a page at the feature
+        else:
+            self.startPageWorker(self.page_index.pageStart(page))
+        return True
+
+    def handleFeatureIdEntered(self):
+        try:
+            f_id = int(self.featureIdLineEdit.text())
+        except ValueError:
+            f_id = None
+        if f_id is None or not self.jumpToFeature(f_id):
+            self.iface.messageBar().pushMessage(f"Feature {self.featureIdLineEdit.text()} is not in the list", 1)
+
+    def handleAttributeValueChange(self, f_id, field_index, value):
+        if self.image_index is None or self.layer.fields().indexOf(self.image_field) != field_index:
+            return
+        if self._hasImage(value):
+            self.image_index.add(f_id)
+        else:
+            self.image_index.discard(f_id)
+        self.features_none_data_cache.discard(f_id)
+
+    def handleFeatureAdded(self, f_id):
+        self.features_extent = None
+        if self.image_index is not None and self._hasImage(self.layer.getFeature(f_id)[self.image_field]):
+            self.image_index.add(f_id)
+
+    def handleFeatureDeleted(self, f_id):
+        self.features_extent = None
+        if self.image_index is not None:
+            self.image_index.discard(f_id)
+
+    def handleGeometryChanged(self, f_id, geometry):
+        self.features_extent = None
+
+    def handleLayerDataChanged(self):
+        self.features_extent = None
+
+    @staticmethod
+    def _hasImage(value) -> bool:
+        if value is None or value == NULL:
+            return False
+        return not isinstance(value, str) or value != ""
+
     def handleDisplayExpressionChange(self):
         # we are not calling features refresh because we don't want to lose the current page start
         # this will be useful when a layer has images in two fields
@@ -216,62 +492,143 @@ class ImagesViewerDialog(QtBaseClass, Ui_Dialog):
 
     def handleFFComboboxChange(self, index):
         if self.ff_combo_box_index == 0:
-            self.canvas.extentsChanged.disconnect(self.refreshFeatures)
+            self.canvas.extentsChanged.disconnect(self.extent_refresh_timer.start)
         elif self.ff_combo_box_index == 1:
             self.layer.selectionChanged.disconnect(self.refreshFeatures)
         elif self.ff_combo_box_index == 2:
             self.layer.selectionChanged.disconnect(self.refreshFeatures)
-            self.canvas.extentsChanged.disconnect(self.refreshFeatures)
+            self.canvas.extentsChanged.disconnect(self.extent_refresh_timer.start)
 
         if index == 0:
-            self.canvas.extentsChanged.connect(self.refreshFeatures)
+            self.canvas.extentsChanged.connect(self.extent_refresh_timer.start)
         elif index == 1:
             self.layer.selectionChanged.connect(self.refreshFeatures)
         elif index == 2:
             self.layer.selectionChanged.connect(self.refreshFeatures)
-            self.canvas.extentsChanged.connect(self.refreshFeatures)
+            self.canvas.extentsChanged.connect(self.extent_refresh_timer.start)
 
         self.ff_combo_box_index = index
 
         self.refreshFeatures()
 
     def refreshFeatures(self):
+        """Find the feature ids with a full scan"""
+        self.extent_refresh_timer.stop()
+        self.features_extent = None  # the selection or the filter may have changed, don't patch a stale list
+        self.startFeaturesWorker()
+
+    def refreshFeaturesForExtent(self):
+        """
+        Called once the canvas extent settled, if most of the previous extent is still in view
+        only the features of the areas that entered or left the view are scanned.
+        """
+        extent = self.canvas.extent()
+        if self.features_extent is None:
+            self.startFeaturesWorker()
+        elif self.features_extent == extent:
+            return
+        elif overlap_ratio(self.features_extent, extent) < INCREMENTAL_REFRESH_MIN_OVERLAP:
+            self.startFeaturesWorker()
+        else:
+            self.startFeaturesWorker(self.features_extent, self.feature_ids)
+
+    def startFeaturesWorker(self, previous_extent=None, previous_ids=None):
         self.abondonWorkers(True, True)
 
         extent = self.canvas.extent()
-        self.features_thread = QThread()
-        self.features_worker = FeaturesWorker(self.layer, extent, self.ff_combo_box_index)
-        self.features_worker.moveToThread(self.features_thread)
-        self.features_thread.started.connect(self.features_worker.run)
-        self.features_worker.finished.connect(self.busyBarDecrement)
-        self.features_worker.finished.connect(self.features_thread.quit)
-        self.features_worker.finished.connect(self.features_worker.deleteLater)
-        self.features_thread.finished.connect(self.features_thread.deleteLater)
-        self.features_worker.features_ready.connect(self.onFeaturesReady)
-        self.features_worker.message_dispatched.connect(self.handleWorkersMessage)
+        # with nothing on screen, show the first page as soon as some ids are known instead of waiting for all of them
+        streaming = not self.feature_ids
+        features_worker = FeaturesWorker(
+            self.layer, extent, self.ff_combo_box_index, previous_extent, previous_ids, streaming
+        )
+        features_worker.finished.connect(self.busyBarDecrement)
+        features_worker.finished.connect(features_worker.deleteLater)
+        # queued signals of an abandoned worker may still be delivered, the slots check which worker sent them
+        features_worker.features_ready.connect(partial(self.onFeaturesReady, features_worker, extent))
+        features_worker.features_chunk_ready.connect(partial(self.onFeaturesChunkReady, features_worker))
+        features_worker.message_dispatched.connect(self.handleWorkersMessage)
         self.busyBarIncrement()
-        self.features_worker.start()  # this should be feautures_thread.start() but that is crashing QGIS
+        self.features_task = self.worker_pool.start(features_worker, VISIBLE_PRIORITY)
+
+    @staticmethod
+    def isCurrentWorker(task, worker) -> bool:
+        """Queued signals of a cancelled worker may still be delivered, only those of task's worker are used"""
+        return bool(task) and worker is task.worker
 
-    def onFeaturesReady(self, feature_ids):
-        if feature_ids == self.feature_ids:
+    def isCurrentFeaturesWorker(self, worker) -> bool:
+        return self.isCurrentWorker(self.features_task, worker)
+
+    def onFeaturesReady(self, worker, extent, feature_ids):
+        if not self.isCurrentFeaturesWorker(worker):
+            return
+        if self.ff_combo_box_index in (0, 2):
+            self.features_extent = extent
+        if feature_ids == self.feature_ids:  # e.g. all ids were already streamed in chunks
+            self.refreshWindowTitle()
+            if self.page_index_ids is not self.feature_ids:
+                self.refreshPageIndex()
             return
 
         self.next_page_start, self.page_start = 0, 0
         self.feature_ids = feature_ids
+        self.refreshPageIndex()
         self.startPageWorker(0)
+        self.refreshWindowTitle()
 
-        self.setWindowTitle(
-            f"{self.layer.name()} -- Features Total: {self.layer.featureCount()}, Filtered: {len(self.feature_ids)}"
-        )
-
-    def startPageWorker(self, page_start, reverse=False, connect=True):
+    def onFeaturesChunkReady(self, worker, chunk):
+        """
+        Merge streamed ids into self.feature_ids. Indexes of the visible page are moved to the same features,
+        the page is only searched again if it is not full yet or new ids fall inside of it.
+        """
+        if not self.isCurrentFeaturesWorker(worker):
+            return
         if not self.feature_ids:
-            self.clearGrid()
-            self.refreshPageButtons()
+            self.next_page_start, self.page_start = 0, 0
+            self.feature_ids = FeatureIdIndex(chunk, is_sorted=True)
+            self.startPageWorker(0)
+            self.refreshWindowTitle(counting=True)
             return
 
-        self.abondonWorkers(page_data=True)
-        self.page_data_worker = PageDataWorker(
+        # page workers may be reading the current list, so merge into a new one
+        previous_ids = self.feature_ids
+        self.feature_ids = previous_ids.merged(chunk)
+        if self.page_index_task:  # it walks the previous list
+            self.page_index_task.cancel()
+            self.page_index_task = None
+        self.page_index = PageIndex()  # indexes moved, the page index is built once all ids are known
+        self.refreshWindowTitle(counting=True)
+
+        page_start = self.feature_ids.reanchor(previous_ids, self.page_start)
+        next_page_start = self.feature_ids.reanchor(previous_ids, self.next_page_start)
+        self.scroll_pages = [(self.feature_ids.reanchor(previous_ids, start), ids) for start, ids in self.scroll_pages]
+        inserted = (next_page_start - page_start) != (self.next_page_start - self.page_start)
+        self.page_start, self.next_page_start = page_start, next_page_start
+
+        if self.scroll_task and not self.scroll_task.done:  # it has the indexes of the old list as well
+            self.scroll_task.cancel()
+            self.scroll_task = None
+            QTimer.singleShot(0, self.loadScrollPages)
+        running = self.page_data_task and not self.page_data_task.done  # it has the indexes of the old list
+        if running or inserted or len(self.page_ids) < self.page_size:
+            self.startPageWorker(self.page_start, self.page_data_reverse if running else False)
+        else:
+            self.refreshPageButtons()
+
+    def refreshWindowTitle(self, counting=False):
+        title = f"{self.layer.name()} -- Features Total: {self.layer.featureCount()}"
+        if self.image_index is not None:
+            title += f", With Image: {len(self.image_index)}"
+        if counting:
+            title += f", Filtered: {len(self.feature_ids)}+ (counting...)"
+        else:
+            title += f", Filtered: {len(self.feature_ids)}"
+            if self.image_index is not None and self.ff_combo_box_index == 3:  # all features, all images are paged
+                title += f", Pages: {-(-len(self.image_index) // self.page_size)}"
+        self.setWindowTitle(title)
+
+    def createPageWorker(self, page_start, reverse=False, pin_page=False) -> PageDataWorker:
+        """pin_page for the workers of the grid, prefetched pages are not pinned"""
+        page_data_worker = PageDataWorker(
             self.layer,
             self.feature_ids,
             self.features_none_data_cache,
@@ -284,16 +641,33 @@ class ImagesViewerDialog(QtBaseClass, Ui_Dialog):
             self.page_size,
             self.relation,
             reverse,
+            self.thumbnail_size,
+            self.thumbnails_disk_cache,
+            self.fetch_executor,
+            self.image_index,
+            pin_page,
         )
-        if connect:
-            self.busyBarIncrement()
-            self.page_data_worker.page_ready.connect(self.onPageReady)
-            self.page_data_worker.finished.connect(self.busyBarDecrement)
-        self.page_data_worker.message_dispatched.connect(self.handleWorkersMessage)
-        self.page_data_worker.finished.connect(self.page_data_worker.deleteLater)
-        self.page_data_worker.start()
-
-    def onPageReady(self, page_start, next_page_start, page_f_ids):
+        page_data_worker.message_dispatched.connect(self.handleWorkersMessage)
+        page_data_worker.finished.connect(page_data_worker.deleteLater)
+        return page_data_worker
+
+    def startPageWorker(self, page_start, reverse=False):
+        if not self.feature_ids:
+            self.clearGrid()
+            self.refreshPageButtons()
+            return
+
+        self.abondonWorkers(page_data=True)  # this also cancels prefetching, the visible page comes first
+        self.page_data_reverse = reverse
+        page_data_worker = self.createPageWorker(page_start, reverse, pin_page=True)
+        self.busyBarIncrement()
+        page_data_worker.page_ready.connect(partial(self.onPageReady, page_data_worker))
+        page_data_worker.finished.connect(self.busyBarDecrement)
+        self.page_data_task = self.worker_pool.start(page_data_worker, VISIBLE_PRIORITY)
+
+    def onPageReady(self, worker, page_start, next_page_start, page_f_ids):
+        if not self.isCurrentWorker(self.page_data_task, worker):  # its indexes may be those of a previous list
+            return
         self.page_start = page_start
         self.next_page_start = next_page_start
 
@@ -301,27 +675,128 @@ class ImagesViewerDialog(QtBaseClass, Ui_Dialog):
         # then do not refresh, but that is not worth the effort since refeshing grid would take few meiliseconds
         # data would already be in cache
         self.page_ids = page_f_ids
+        if self.image_index is None and not self.page_data_reverse:
+            self.page_index.record(page_start, next_page_start, len(self.feature_ids))
         self.refreshGrid()
         self.refreshPageButtons()
 
-        # get data for the next page in anticipation of user clicking next soon
-        # do not connect to its signal, so that it doesn't actually display the next page
-        self.startPageWorker(self.next_page_start, connect=False)
+        # get data for the pages around this one in anticipation of user clicking next or previous soon
+        # prefetch workers are not connected to onPageReady, so they don't actually display their page
+        self.page_prefetcher.schedule(self.page_start, self.next_page_start, len(self.feature_ids))
+
+        if self.continuous_scroll:  # this page replaces the pages in the grid, more are loaded around it
+            self.scroll_pages = [(page_start, page_f_ids)]
+            self.mainScrollArea.verticalScrollBar().setValue(0)
+            QTimer.singleShot(0, self.loadScrollPages)
+
+    def loadScrollPages(self):
+        """
+        In continuous scroll mode, load the page after (or before) the pages in the grid once the viewport gets
+        within SCROLL_LOAD_MARGIN viewport heights of it. Pages are loaded one at a time, with at most
+        SCROLL_LOADED_PAGES in the grid, a page is only dropped at the other end once it is out of view.
+        """
+        if not self.continuous_scroll or not self.scroll_pages or not self.image_field:
+            return
+        if (self.page_data_task and not self.page_data_task.done) or (self.scroll_task and not self.scroll_task.done):
+            return
+
+        bar = self.mainScrollArea.verticalScrollBar()
+        viewport_height = self.mainScrollArea.viewport().height()
+        margin = viewport_height * SCROLL_LOAD_MARGIN
+        full = len(self.scroll_pages) >= SCROLL_LOADED_PAGES
+
+        if bar.value() >= bar.maximum() - margin and self.next_page_start < len(self.feature_ids):
+            if not full or self._scrollPageBottom(0) < bar.value() - margin:
+                self.startScrollPageWorker(self.next_page_start)
+        elif bar.value() <= margin and self.page_start > 0:
+            if not full or self._scrollPageTop(-1) > bar.value() + viewport_height + margin:
+                page = self.page_index.pageNumber(self.page_start)
+                if page:  # the previous page start is known, no need to scan backwards
+                    self.startScrollPageWorker(self.page_index.pageStart(page - 1))
+                else:
+                    self.startScrollPageWorker(self.page_start, reverse=True)
+
+    def _scrollPageTop(self, page):
+        """y of the first frame of self.scroll_pages[page] in the grid"""
+        pages_before = page % len(self.scroll_pages)
+        item = self.gridLayout.itemAt(sum(len(ids) for _, ids in self.scroll_pages[:pages_before]))
+        return item.widget().geometry().top() if item else 0
+
+    def _scrollPageBottom(self, page):
+        """Bottom of the last frame of self.scroll_pages[page] in the grid"""
+        pages_through = page % len(self.scroll_pages) + 1
+        item = self.gridLayout.itemAt(sum(len(ids) for _, ids in self.scroll_pages[:pages_through]) - 1)
+        return item.widget().geometry().bottom() if item else 0
+
+    def startScrollPageWorker(self, page_start, reverse=False):
+        """Load the page next to the pages in the grid, it is added to them by onScrollPageReady"""
+        self.page_prefetcher.cancel()  # the page being scrolled to comes first
+        page_data_worker = self.createPageWorker(page_start, reverse, pin_page=True)
+        self.busyBarIncrement()
+        page_data_worker.page_ready.connect(partial(self.onScrollPageReady, page_data_worker))
+        page_data_worker.finished.connect(self.busyBarDecrement)
+        self.scroll_task = self.worker_pool.start(page_data_worker, VISIBLE_PRIORITY)
+
+    def onScrollPageReady(self, worker, page_start, next_page_start, page_f_ids):
+        """Add the page to the grid, dropping the page at the other end if there are too many, the view stays put"""
+        if not self.isCurrentWorker(self.scroll_task, worker):
+            return
+        if page_start == self.next_page_start:
+            if self.image_index is None:
+                self.page_index.record(page_start, next_page_start, len(self.feature_ids))
+            self.next_page_start = next_page_start
+            if page_f_ids:
+                self.scroll_pages.append((page_start, page_f_ids))
+            dropped = self.scroll_pages[0] if len(self.scroll_pages) > SCROLL_LOADED_PAGES else None
+            if dropped:
+                self.scroll_pages.pop(0)
+                self.page_start = self.scroll_pages[0][0]
+            anchor = len(dropped[1]) if dropped else None  # first frame kept, it moves up by the dropped rows
+        elif next_page_start == self.page_start:
+            self.page_start = page_start
+            if page_f_ids:
+                self.scroll_pages.insert(0, (page_start, page_f_ids))
+            if len(self.scroll_pages) > SCROLL_LOADED_PAGES:
+                self.next_page_start, _ = self.scroll_pages.pop()  # pages are contiguous
+            anchor = 0 if page_f_ids else None  # first frame before, it moves down by the added rows
+        else:  # the pages in the grid changed while the page was loading
+            QTimer.singleShot(0, self.loadScrollPages)
+            return
+
+        anchor_widget = self.gridLayout.itemAt(anchor).widget() if anchor is not None else None
+        anchor_y = anchor_widget.y() if anchor_widget else 0
+        self.page_ids = [f_id for _, ids in self.scroll_pages for f_id in ids]
+        self.refreshGrid()
+        self.refreshPageButtons()
+        self.page_prefetcher.schedule(self.page_start, self.next_page_start, len(self.feature_ids))
+        QTimer.singleShot(0, partial(self.keepScrollAnchor, anchor_widget, anchor_y))
+
+    def keepScrollAnchor(self, anchor_widget, anchor_y):
+        """Scroll by how much anchor_widget moved once the grid is laid out, then check if more pages are needed"""
+        if anchor_widget is not None and anchor_widget.isVisible():
+            bar = self.mainScrollArea.verticalScrollBar()
+            bar.setValue(bar.value() + anchor_widget.y() - anchor_y)
+        self.loadScrollPages()
 
     def handleWorkersMessage(self, message: str, level: int):
         self.iface.messageBar().pushMessage(message, level)
 
     def busyBarIncrement(self):
         self.busy_bar_count += 1
-        self.busyBar.setVisible(True)
+        if not self.busyBar.isVisible() and not self.busy_bar_timer.isActive():
+            self.busy_bar_timer.start()  # only show the bar if the work takes a while, e.g. pages not prefetched
         self.busyBar.setToolTip(f"Running Tasks: {self.busy_bar_count}")
 
     def busyBarDecrement(self):
         self.busy_bar_count -= 1
         if self.busy_bar_count == 0:
+            self.busy_bar_timer.stop()
             self.busyBar.setVisible(False)
         self.busyBar.setToolTip(f"Running Tasks: {self.busy_bar_count}")
 
+    def showBusyBar(self):
+        self.busyBar.setVisible(self.busy_bar_count > 0)
+
     def clearGrid(self):
         for i in reversed(range(self.gridLayout.count())):
             widget = self.gridLayout.itemAt(i).widget()
@@ -333,33 +808,37 @@ class ImagesViewerDialog(QtBaseClass, Ui_Dialog):
         # start_time = time.time()  # Start time before the operation
         # print("Refreshing Grid...")
 
-        self.clearGrid()
+        # the features in the grid are never evicted, the pins of features that left it are dropped
+        self.features_data_cache.setPinned(self.page_ids)
+        self.features_frames_cache.setPinned(self.page_ids)
+
+        # frames staying in the grid are not hidden, so they keep their textures
+        previous_frames = []
+        for i in reversed(range(self.gridLayout.count())):
+            widget = self.gridLayout.itemAt(i).widget()
+            self.gridLayout.removeWidget(widget)
+            previous_frames.append(widget)
 
         frames = []
         error_occured = False
+        if VIRTUALIZED_GRID:
+            self.frame_pool.arrange(self.page_ids, ChildrenFeatureFrame if self.relation else FeatureFrame)
 
         for f_id in self.page_ids:
             try:
-                if self.features_frames_cache.keyExist(f_id):  # cache hit
+                if VIRTUALIZED_GRID:  # a frame of the pool, rebound if it showed another feature
+                    f_data = self.features_data_cache.get(f_id)
+                    frame, created = self.frame_pool.frame(f_id, partial(self.createFrame, f_data))
+                    if created:
+                        frame.buildUI(f_data.data)
+                    elif frame.data is not f_data.data:
+                        frame.bind(f_data.feature, f_data.title, f_data.data, f_data.children)
+                elif self.features_frames_cache.keyExist(f_id):  # cache hit
                     frame = self.features_frames_cache.get(f_id)
-                    frame.show()
                 else:  # cache miss
-                    f_data = self.features_data_cache.get(f_id)
-
-                    if not self.relation:
-                        frame = FeatureFrame(self.iface, self.canvas, self.layer, f_data.feature, f_data.title)
-                    else:
-                        frame = ChildrenFeatureFrame(
-                            self.iface,
-                            self.canvas,
-                            self.layer,
-                            f_data.feature,
-                            f_data.title,
-                            self.relations[self.relation_index - 1].referencingLayer(),
-                            self.image_field,
-                            self.field_type,
-                            f_data.children,
-                        )
+                    # the frame owns the data from now on, it is counted by the frames cache only
+                    f_data = self.features_data_cache.take(f_id)
+                    frame = self.createFrame(f_data)
                     frame.buildUI(f_data.data)
                     self.features_frames_cache.put(f_id, frame)
 
@@ -381,27 +860,82 @@ class ImagesViewerDialog(QtBaseClass, Ui_Dialog):
                 "Creating Frames: Unable to create frames for all features. See logs for details.", 1
             )
 
-        row = 0
-        col = 0
-        for frame in frames:
-            self.gridLayout.addWidget(frame, row, col)
+        for index, frame in enumerate(frames):
+            self.gridLayout.addWidget(frame, *divmod(index, self.columns))
+            frame.show()
 
-            col += 1
-            if col > 2:  # Change this number to adjust how many images per row
-                col = 0
-                row += 1
+        shown = set(frames)
+        for widget in previous_frames:
+            if widget not in shown:
+                widget.hide()  # hide it for now, we will delete or rebind it through the cache or the pool
 
         # print("Grid: {} meiliseconds".format((time.time() - start_time) * 1000))  # Print out the time it took
         # print("current length of frames store", self.features_frames_cache.length())
+        self.reportCacheUsage()
+
+    def createFrame(self, f_data):
+        """New frame for the feature data at the selected size, buildUI is left to the caller"""
+        if not self.relation:
+            frame = FeatureFrame(
+                self.iface,
+                self.canvas,
+                self.layer,
+                f_data.feature,
+                f_data.title,
+                self.image_field,
+                self.field_type,
+                self.worker_pool,
+            )
+        else:
+            frame = ChildrenFeatureFrame(
+                self.iface,
+                self.canvas,
+                self.layer,
+                f_data.feature,
+                f_data.title,
+                self.relations[self.relation_index - 1].referencingLayer(),
+                self.image_field,
+                self.field_type,
+                f_data.children,
+                self.thumbnail_size,
+                self.thumbnails_disk_cache,
+                self.worker_pool,
+            )
+        frame.setMinimumSize(*FRAME_SIZES[self.frame_size_name])
+        return frame
+
+    def reportCacheUsage(self):
+        mb = 1024 * 1024
+        frames, data = self.features_frames_cache, self.features_data_cache
+        self.refreshButton.setToolTip(
+            "Refresh\n"
+            f"Frames cache: {frames.usage() // mb} / {frames.maxBytes() // mb} MB\n"
+            f"Frames pool: {len(self.frame_pool)} frames\n"
+            f"Data cache: {data.usage() // mb} / {data.maxBytes() // mb} MB\n"
+            f"Textures: {Texture.resident_bytes // mb} MB\n"
+            f"Thumbnails on disk: {self.thumbnails_disk_cache.usage() // mb} MB"
+        )
 
     def refreshPageButtons(self):
         self.previousPageButton.setEnabled(self.page_start > 0)
         self.nextPageButton.setEnabled(self.next_page_start and self.next_page_start < len(self.feature_ids))
 
+        page_count = self.page_index.pageCount()
+        page = self.page_index.pageNumber(self.page_start)
+        self.pageSpinBox.blockSignals(True)
+        self.pageSpinBox.setMaximum(page_count)
+        self.pageSpinBox.setSuffix(f" / {page_count}" if self.page_index.complete else f" / {page_count}+")
+        self.pageSpinBox.setValue((page if page is not None else self.page_index.pageOf(self.page_start)) + 1)
+        self.pageSpinBox.blockSignals(False)
+
     def displayPrevPage(self):
         self.previousPageButton.setEnabled(False)
         self.abondonWorkers(page_data=True)
-        self.startPageWorker(self.page_start, reverse=True)
+        page = self.page_index.pageNumber(self.page_start)
+        if page:  # the previous page start is known, no need to scan backwards
+            self.startPageWorker(self.page_index.pageStart(page - 1))
+        else:
+            self.startPageWorker(self.page_start, reverse=True)
 
     def displayNextPage(self):
         self.nextPageButton.setEnabled(False)  # prevents crashing from multiple clicks
@@ -409,35 +943,69 @@ class ImagesViewerDialog(QtBaseClass, Ui_Dialog):
         self.startPageWorker(self.page_start)
 
     def abondonWorkers(self, features=False, page_data=False):
-        if features and self.features_worker:
-            self.features_worker.stop()
-            self.features_thread = None
-            self.features_worker = None
-
-        if page_data and self.page_data_worker:
-            self.page_data_worker.stop()
-            self.page_data_worker = None
+        if features and self.features_task:
+            self.features_task.cancel()
+            self.features_task = None
+
+        if page_data:
+            self.page_prefetcher.cancel()
+            if self.page_data_task:
+                self.page_data_task.cancel()
+                self.page_data_task = None
+            if self.scroll_task:
+                self.scroll_task.cancel()
+                self.scroll_task = None
 
     def clearCaches(self):
         self.features_frames_cache.clear()
+        self.frame_pool.clear()  # frames know the image field and the relation they were made for
         self.features_none_data_cache.clear()
         self.features_broken_data_cache.clear()
         self.features_data_cache.clear()  # clear all cached data
 
+    @staticmethod
+    def closeDiskCache(worker_pool, fetch_executor, disk_cache):
+        """Runs in its own thread once the dialog is closed"""
+        worker_pool.waitForDone()
+        fetch_executor.shutdown(wait=True)
+        disk_cache.close()
+
     def closeEvent(self, event):
         """Extends the super.closeEvent"""
+        self.extent_refresh_timer.stop()
         self.abondonWorkers(True, True)
+        if self.image_index_task:
+            self.image_index_task.cancel()
+        if self.page_index_task:
+            self.page_index_task.cancel()
+        self.worker_pool.shutdown()  # children and full image workers of the frames too
+        self.fetch_executor.shutdown(wait=False)
         self.clearCaches()  # release resources
+        # abandoned workers return at their next check but a running fetch may still use the disk cache,
+        # its index is closed once they are all done, without holding the GUI thread while they finish
+        threading.Thread(
+            target=self.closeDiskCache,
+            args=(self.worker_pool, self.fetch_executor, self.thumbnails_disk_cache),
+            name="ImagesViewerClose",
+            daemon=True,
+        ).start()
 
         # When window is closed, disconnect  signals
         self.layer.displayExpressionChanged.disconnect(self.handleDisplayExpressionChange)
+        self.layer.attributeValueChanged.disconnect(self.handleAttributeValueChange)
+        self.layer.featureAdded.disconnect(self.handleFeatureAdded)
+        self.layer.featureDeleted.disconnect(self.handleFeatureDeleted)
+        self.layer.afterCommitChanges.disconnect(self.refreshImageIndex)
+        self.layer.afterRollBack.disconnect(self.refreshImageIndex)
+        self.layer.geometryChanged.disconnect(self.handleGeometryChanged)
+        self.layer.dataChanged.disconnect(self.handleLayerDataChanged)
         if self.ff_combo_box_index == 0:
-            self.canvas.extentsChanged.disconnect(self.refreshFeatures)
+            self.canvas.extentsChanged.disconnect(self.extent_refresh_timer.start)
         elif self.ff_combo_box_index == 1:
             self.layer.selectionChanged.disconnect(self.refreshFeatures)
         elif self.ff_combo_box_index == 2:
             self.layer.selectionChanged.disconnect(self.refreshFeatures)
-            self.canvas.extentsChanged.disconnect(self.refreshFeatures)
+            self.canvas.extentsChanged.disconnect(self.extent_refresh_timer.start)
 
         # save the dialog's position and size
         self.settings.setValue("geometry", self.saveGeometry())
@@ -446,5 +1014,8 @@ class ImagesViewerDialog(QtBaseClass, Ui_Dialog):
         # remember configuration
         self.settings.setValue("imageField", self.image_field)
         self.settings.setValue("relationIndex", self.relation_index)
+        self.default_settings.setValue("columns", self.columns)
+        self.default_settings.setValue("frameSize", self.frame_size_name)
+        self.default_settings.setValue("continuousScroll", self.continuous_scroll)
 
         super().closeEvent(event)
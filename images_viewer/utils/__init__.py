@@ -3,8 +3,32 @@ Images Viewer Utils Module
 """
 
 from .config import *
-from .feature_worker import FeaturesWorker
+from .children_data_worker import ChildrenDataWorker
+from .decode_pool import DecodeProcessPool
+from .feature_index import FeatureIdIndex, FeatureIdSet
+from .feature_worker import FeaturesWorker, overlap_ratio, subtract_rectangle
+from .full_image_worker import FullImageWorker
+from .http_session import HttpSession, UrlResponse
 from .image_factory import ImageFactory
-from .lru_cache import FeatureDataLRUCache, WidgetLRUCache
+from .image_index_worker import ImageIndexWorker, has_image_expression
+from .lru_cache import (
+    FeatureDataLRUCache,
+    LRUCache,
+    SizedLRUCache,
+    WidgetLRUCache,
+    image_bytes,
+)
 from .page_data_worker import FeatureData, PageDataWorker
+from .page_index import PageIndex, PageIndexWorker
+from .page_prefetcher import PagePrefetcher
+from .prethumbnail_task import PrethumbnailTask
+from .thumbnail_cache import ThumbnailDiskCache
 from .utils import *
+from .worker_pool import (
+    CHILDREN_PRIORITY,
+    SPECULATIVE_PRIORITY,
+    VISIBLE_PRIORITY,
+    TaskHandle,
+    Worker,
+    WorkerPool,
+)
@@ -0,0 +1,41 @@
+from PyQt5.QtCore import pyqtSignal
+
+from images_viewer.utils.image_factory import ImageFactory
+from images_viewer.utils.worker_pool import Worker
+
+
+class ChildrenDataWorker(Worker):
+    """Worker to get image data of the child features shown by a ChildrenFeatureFrame"""
+
+    data_ready = pyqtSignal(int, object)  # child index, PIL image or None if the child has no image
+    data_failed = pyqtSignal(int, str)  # child index, error
+
+    def __init__(self, children, image_layer_id, image_field, field_type, thumbnail_size=None, disk_cache=None):
+        """children is a list of (child index, child feature) in the order they should be loaded"""
+        super().__init__()
+        self.children = children
+        self.image_layer_id = image_layer_id
+        self.image_field = image_field
+        self.field_type = field_type
+        self.thumbnail_size = thumbnail_size
+        self.disk_cache = disk_cache
+
+    def run(self):
+        for index, feature in self.children:
+            if self.abandon:
+                return
+            try:
+                field_content = feature[self.image_field]
+                if self.disk_cache and self.thumbnail_size:
+                    data = ImageFactory.extract_cached_data(
+                        field_content,
+                        self.field_type,
+                        self.thumbnail_size,
+                        self.disk_cache,
+                        self.disk_cache.key(self.image_layer_id, self.image_field, feature.id()),
+                    )
+                else:
+                    data = ImageFactory.extract_data(field_content, self.field_type, self.thumbnail_size)
+                self.data_ready.emit(index, data)
+            except Exception as e:
+                self.data_failed.emit(index, repr(e))
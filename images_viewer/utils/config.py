@@ -1,3 +1,38 @@
 FRAMES_CACHE_CAPACITY = 150
+FRAMES_CACHE_BYTES = 1024 * 1024 * 1024  # estimated pixels and textures held by cached frames
+VIRTUALIZED_GRID = True  # reuse a page worth of frames for every page instead of caching a frame per feature
+FEATURES_DATA_CACHE_BYTES = 512 * 1024 * 1024  # decoded pixels of cached feature data
+CHILDREN_DATA_CACHE_CAPACITY = 5  # child images kept by each ChildrenFeatureFrame
+FEATURE_ID_BITMAP_LIMIT = 1 << 27  # ids below this are flagged in a bitmap (16 MB at most), others in a set
+
+HAS_IMAGE_INDEX = True  # find the features with an image with one query, so pages skip the others without fetching
+PREFETCH_PAGES_AHEAD = 2  # pages after the visible one kept warm in the caches
+PREFETCH_PAGES_BEHIND = 1  # pages before the visible one kept warm in the caches
+WORKER_POOL_THREADS = 4  # features, page and children workers running at the same time
+EXTENT_REFRESH_DELAY = 250  # milliseconds without extent changes before the features are refreshed
+INCREMENTAL_REFRESH_MIN_OVERLAP = 0.5  # below this overlap of old and new extent a full scan is cheaper
+FEATURES_FIRST_CHUNK_SIZE = 1000  # ids streamed before the first page is searched for images
+FEATURES_MAX_CHUNK_SIZE = 100000  # chunks grow up to this, merging is cheaper with fewer bigger chunks
+PAGE_INDEX_FIRST_CHUNK = 100  # pages found before the page index is first handed over, then every 4 times more
+BUSY_BAR_DELAY = 300  # milliseconds, the busy bar is not shown for work finishing faster than this
 
 IMGE_URL_REQUEST_TIMEOUT = 30
+IMAGE_URL_REQUEST_RETRIES = 3
+IMAGE_URL_REQUEST_BACKOFF = 0.5  # seconds, doubled after every retry
+IMAGE_URL_MAX_CONNECTIONS_PER_HOST = 8
+IMAGE_URL_REVALIDATE_AGE = 24 * 60 * 60  # seconds a cached thumbnail of an url is used without asking the server
+IMAGE_FETCH_CONCURRENCY = 8  # images of a page fetched and decoded in parallel
+DECODE_PROCESSES = 0  # processes decoding thumbnails outside of the GIL, 0 decodes in threads, None for all cores
+PRETHUMBNAIL_BATCH_SIZE = 500  # features fetched per request by the pre-thumbnail task, progress is saved after each
+PRETHUMBNAIL_CACHE_FILL = 0.9  # share of the disk cache capacity the pre-thumbnail task writes before it stops
+
+FRAME_SIZE = (400, 600)  # minimum (width, height) of a feature frame, images are decoded to fit in it
+PANORAMA_THUMBNAIL_SCALE = 4  # 360 thumbnails are this many frame widths wide, only a part of them is visible at a time
+FRAME_SIZES = {"Small": (200, 300), "Medium": (300, 450), "Large": FRAME_SIZE}  # selectable in the toolbar
+GRID_COLUMNS = 3  # default frames per row
+GRID_ROWS = 3  # rows of a page, a page holds GRID_ROWS * columns frames
+SCROLL_LOADED_PAGES = 4  # pages kept in the grid in continuous scroll mode, pages further away are dropped
+SCROLL_LOAD_MARGIN = 1.0  # viewport heights from the end of the grid at which the next page is loaded
+
+THUMBNAIL_DISK_CACHE_DIR = "images_viewer/thumbnails"  # relative to the QGIS profile folder
+THUMBNAIL_DISK_CACHE_SIZE = 1024 * 1024 * 1024  # bytes
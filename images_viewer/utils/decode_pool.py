@@ -0,0 +1,131 @@
+import multiprocessing
+import multiprocessing.spawn
+import os
+import shutil
+import sys
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from contextlib import contextmanager
+
+from qgis.core import QgsMessageLog
+
+from images_viewer.decode_process import decode_reduced, image_from_result
+from images_viewer.utils.config import DECODE_PROCESSES
+
+_spawn_executable_lock = threading.Lock()
+
+
+def python_executable():
+    """
+    Python interpreter to spawn the decode processes with, None if there is none.
+    Inside QGIS sys.executable is usually the QGIS application itself, the interpreter is looked up next to it.
+    """
+    if os.path.basename(sys.executable).lower().startswith("python"):
+        return sys.executable
+    version = f"{sys.version_info.major}.{sys.version_info.minor}"
+    if os.name == "nt":
+        candidates = [os.path.join(sys.exec_prefix, "python.exe"), os.path.join(sys.exec_prefix, "python3.exe")]
+    else:
+        candidates = [os.path.join(sys.exec_prefix, "bin", f"python{version}"), shutil.which(f"python{version}")]
+    for candidate in candidates:
+        if candidate and os.path.isfile(candidate):
+            return candidate
+    return None
+
+
+@contextmanager
+def spawn_executable(executable):
+    """
+    Spawn processes with executable inside the block. The interpreter of the spawn start method is process-wide,
+    shared with QGIS and the other plugins, so the previous one is restored when the block exits.
+    """
+    with _spawn_executable_lock:
+        previous = multiprocessing.spawn.get_executable()
+        multiprocessing.spawn.set_executable(executable)
+        try:
+            yield
+        finally:
+            multiprocessing.spawn.set_executable(previous)
+
+
+class DecodeProcessPool:
+    """
+    Pool of processes decoding and downscaling images, so that heavy decodes do not hold the GIL QGIS,
+    its Python console and the other plugins share. Only the source (bytes or file path) is sent to a process,
+    the reduced pixels come back through shared memory, see decode_process.
+
+    The pool is optional (DECODE_PROCESSES), instance() returns None when it is disabled or processes can't be
+    spawned, callers then decode in their own thread. If the pool breaks later on, it is disabled the same way.
+
+    Processes are started with the interpreter found by python_executable rather than the spawn default, which
+    is the QGIS application. That setting is process-wide, it is only changed while the pool starts processes:
+    the resource tracker when the pool is created and the decode processes when tasks are submitted.
+    """
+
+    _instance = None
+    _instance_lock = threading.Lock()
+    _unavailable = False
+
+    def __init__(self, executable, processes):
+        self._executable = executable
+        context = multiprocessing.get_context("spawn")  # fork is unsafe in a process running Qt threads
+        with spawn_executable(executable):  # the resource tracker process starts with the pool's queues
+            self._executor = ProcessPoolExecutor(processes, mp_context=context)
+
+    @classmethod
+    def instance(cls):
+        """Pool shared by the whole plugin, None if images are decoded in threads"""
+        with cls._instance_lock:
+            if cls._instance is None and not cls._unavailable:
+                processes = DECODE_PROCESSES if DECODE_PROCESSES is not None else os.cpu_count()
+                executable = python_executable() if processes else None
+                if executable is None:
+                    cls._unavailable = True
+                    if processes:
+                        cls._log("No Python interpreter found to start decode processes, decoding in threads")
+                else:
+                    cls._instance = cls(executable, processes)
+            return cls._instance
+
+    @classmethod
+    def shutdown(cls):
+        """Stop the processes, called when the plugin is unloaded"""
+        with cls._instance_lock:
+            if cls._instance is not None:
+                cls._instance._executor.shutdown(wait=False, cancel_futures=True)
+                cls._instance = None
+
+    def decode(self, source, target_size, panorama_size):
+        """
+        Decode source (bytes or a file path) reduced to fit in target_size, or panorama_size for 360 images,
+        like ImageFactory._decode.
+        Errors of the image itself are raised as usual, None is returned if the pool itself failed.
+        """
+        if not isinstance(source, str):
+            source = bytes(source)  # QByteArray from BLOB fields can't be pickled
+        try:
+            with spawn_executable(self._executable):  # processes are started on demand by submit
+                future = self._executor.submit(decode_reduced, source, target_size, panorama_size)
+        except (OSError, RuntimeError) as e:  # processes could not start, or the pool was shut down
+            self._disable(e)
+            return None
+        try:
+            result = future.result()  # errors decoding the image are raised from the process as they are
+        except BrokenProcessPool as e:  # a process died
+            self._disable(e)
+            return None
+        return image_from_result(result)
+
+    def _disable(self, error):
+        cls = type(self)
+        with cls._instance_lock:
+            if cls._instance is self:
+                cls._instance = None
+                cls._unavailable = True
+                self._executor.shutdown(wait=False, cancel_futures=True)
+                cls._log(f"Decode processes failed, decoding in threads from now on: {repr(error)}")
+
+    @staticmethod
+    def _log(message):
+        QgsMessageLog.logMessage(message, "Images Viewer", level=1)
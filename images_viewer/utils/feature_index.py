@@ -0,0 +1,135 @@
+import bisect
+import heapq
+import threading
+from array import array
+
+from images_viewer.utils.config import FEATURE_ID_BITMAP_LIMIT
+
+
+class FeatureIdIndex:
+    """
+    Immutable sorted list of feature ids stored as 8 bytes per id.
+    A Python list of ints costs about 36 bytes per id, on layers with millions of features that adds up quickly.
+    Instances are shared with the workers, so changes return a new index instead of modifying this one.
+    """
+
+    def __init__(self, ids=(), is_sorted=False):
+        if isinstance(ids, array) and is_sorted:
+            self.ids = ids
+        else:
+            self.ids = array("q", ids if is_sorted else sorted(ids))
+
+    def __len__(self):
+        return len(self.ids)
+
+    def __getitem__(self, index):
+        return self.ids[index]
+
+    def __iter__(self):
+        return iter(self.ids)
+
+    def __eq__(self, other):
+        if isinstance(other, FeatureIdIndex):
+            return self.ids == other.ids  # compared in C, this is how a refresh finds out nothing changed
+        return NotImplemented
+
+    def __contains__(self, f_id):
+        index = bisect.bisect_left(self.ids, f_id)
+        return index < len(self.ids) and self.ids[index] == f_id
+
+    def bisectLeft(self, f_id) -> int:
+        """Index of f_id, or of the first id after it if f_id is not in the index"""
+        return bisect.bisect_left(self.ids, f_id)
+
+    def bisectRight(self, f_id) -> int:
+        """Index of the first id after f_id"""
+        return bisect.bisect_right(self.ids, f_id)
+
+    def reanchor(self, previous, index) -> int:
+        """
+        Index in this index of the feature that was at index in previous, an index this one was made from.
+        An index past the end of previous goes after its last id, so ids added after it are included.
+        """
+        if index < len(previous):
+            return self.bisectLeft(previous[index])
+        return self.bisectRight(previous[-1])
+
+    def merged(self, other) -> "FeatureIdIndex":
+        """New index with the ids of both, other must be sorted and must not have ids of this index"""
+        return FeatureIdIndex(array("q", heapq.merge(self.ids, other)), is_sorted=True)
+
+    def patched(self, removed, added) -> "FeatureIdIndex":
+        """New index without the ids in the set removed and with the ids of added that are not in it yet"""
+        ids = array("q", (f_id for f_id in self.ids if f_id not in removed)) if removed else self.ids
+        added = sorted(f_id for f_id in set(added) if f_id not in self)
+        if added:
+            ids = array("q", heapq.merge(ids, added))
+        return FeatureIdIndex(ids, is_sorted=True)
+
+
+class FeatureIdSet:
+    """
+    Set of feature ids backed by a bitmap, one bit per id up to the largest id added.
+    Feature ids are usually dense and start at 0 or 1, ids that are negative (features not saved yet)
+    or above FEATURE_ID_BITMAP_LIMIT are kept in a regular set.
+    Page workers add ids while the GUI thread discards them, changes hold a lock since a bit is set by
+    reading and writing back its whole byte.
+    """
+
+    def __init__(self, limit=FEATURE_ID_BITMAP_LIMIT):
+        self.limit = limit
+        self.bitmap = bytearray()
+        self.others = set()
+        self.count = 0
+        self._lock = threading.Lock()
+
+    def add(self, f_id):
+        with self._lock:
+            self._add(f_id)
+
+    def _add(self, f_id):
+        if f_id < 0 or f_id >= self.limit:
+            if f_id not in self.others:
+                self.others.add(f_id)
+                self.count += 1
+            return
+        byte, bit = divmod(f_id, 8)
+        if byte >= len(self.bitmap):
+            size = max(byte + 1, min(len(self.bitmap) * 2, self.limit // 8))  # grow geometrically up to the limit
+            self.bitmap.extend(bytes(size - len(self.bitmap)))
+        if not self.bitmap[byte] & (1 << bit):
+            self.bitmap[byte] |= 1 << bit
+            self.count += 1
+
+    def discard(self, f_id):
+        with self._lock:
+            self._discard(f_id)
+
+    def _discard(self, f_id):
+        if f_id not in self:
+            return
+        if f_id < 0 or f_id >= self.limit:
+            self.others.discard(f_id)
+        else:
+            byte, bit = divmod(f_id, 8)
+            self.bitmap[byte] &= ~(1 << bit) & 0xFF
+        self.count -= 1
+
+    def __contains__(self, f_id):
+        if f_id < 0 or f_id >= self.limit:
+            return f_id in self.others
+        byte, bit = divmod(f_id, 8)
+        return byte < len(self.bitmap) and bool(self.bitmap[byte] & (1 << bit))
+
+    def __len__(self):
+        return self.count
+
+    def clear(self):
+        with self._lock:
+            self.bitmap = bytearray()
+            self.others.clear()
+            self.count = 0
+
+    def memoryUsage(self) -> int:
+        """Approximate bytes held by the set"""
+        return len(self.bitmap) + len(self.others) * 64
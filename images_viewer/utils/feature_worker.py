@@ -1,62 +1,149 @@
 # import time
 
 import time
+from array import array
 
-from PyQt5.QtCore import QThread, pyqtSignal, pyqtSlot
-from qgis.core import QgsFeatureRequest
+from PyQt5.QtCore import pyqtSignal
+from qgis.core import QgsFeatureRequest, QgsRectangle
 
+from images_viewer.utils.config import FEATURES_FIRST_CHUNK_SIZE, FEATURES_MAX_CHUNK_SIZE
+from images_viewer.utils.feature_index import FeatureIdIndex
+from images_viewer.utils.worker_pool import Worker
 
-class FeaturesWorker(QThread):
+
+class FeaturesWorker(Worker):
     """Worker to fetch feature IDs based on a given filter."""
 
-    features_ready = pyqtSignal(list)
+    features_ready = pyqtSignal(object)  # FeatureIdIndex
+    features_chunk_ready = pyqtSignal(list)  # sorted ids found so far that were not in a previous chunk
     message_dispatched = pyqtSignal(str, int)
-    finished = pyqtSignal()  # Signal when the worker has finished its task
 
-    def __init__(self, layer, extent, ff_index):
-        super(QThread, self).__init__()
+    def __init__(self, layer, extent, ff_index, previous_extent=None, previous_ids=None, streaming=False):
+        """
+        If previous_extent and previous_ids (FeatureIdIndex) are given, the ids of extent are found incrementally:
+        only the areas that entered or left the view are scanned and previous_ids is patched.
+        This is only valid for ff_index 0 and 2, and only if the layer and selection did not change since.
+        With streaming, extent scans emit features_chunk_ready as they go, features_ready still comes last.
+        """
+        super().__init__()
         self.layer = layer
         self.extent = extent
-        self.abandon = False
         self.ff_index = ff_index
+        self.previous_extent = previous_extent
+        self.previous_ids = previous_ids
+        self.streaming = streaming
+        self.chunk_size = FEATURES_FIRST_CHUNK_SIZE
+        self.streamed_count = 0  # ids of feature_ids already emitted in chunks
 
     def run(self):
         try:
-            feature_ids = []
-            if self.ff_index == 0:
-                request = QgsFeatureRequest().setFilterRect(self.extent)
-                for feat in self.layer.getFeatures(request):
+            feature_ids = array("q")  # 8 bytes per id while scanning
+            if self.previous_extent is not None and self.ff_index in (0, 2):
+                feature_ids = self._patchIds()
+            elif self.ff_index == 0:
+                for feat in self.layer.getFeatures(self._idsRequest(self.extent)):
                     if self.abandon:
                         # print("!!!abondoning features worker")
                         return
                     feature_ids.append(feat.id())
+                    self._stream(feature_ids)
             elif self.ff_index == 1:
                 feature_ids = self.layer.selectedFeatureIds()
                 # to fix: https://github.com/qgis/QGIS/issues/54148
             elif self.ff_index == 2:
-                selected_ids = set(self.layer.selectedFeatureIds())
-                request = QgsFeatureRequest().setFilterRect(self.extent)
-                for feat in self.layer.getFeatures(request):
-                    if self.abandon:
-                        break
-                    if feat.id() in selected_ids:
+                # only the selected features are tested against the extent, not every feature in it
+                selected_ids = self.layer.selectedFeatureIds()
+                if selected_ids:
+                    request = self._idsRequest(self.extent).setFilterFids(selected_ids)
+                    for feat in self.layer.getFeatures(request):
+                        if self.abandon:
+                            break
                         feature_ids.append(feat.id())
+                        self._stream(feature_ids)
             elif self.ff_index == 3:
-                for feat in self.layer.getFeatures():
-                    if self.abandon:
-                        break
-                    feature_ids.append(feat.id())
+                feature_ids = list(self.layer.allFeatureIds())  # the provider lists ids without reading features
 
             if not self.abandon:  # Check if the thread should be abandoned
-                feature_ids.sort()
+                self._stream(feature_ids, flush=True)
+                if not isinstance(feature_ids, FeatureIdIndex):
+                    feature_ids = FeatureIdIndex(feature_ids)
                 self.features_ready.emit(feature_ids)
 
         except Exception as e:  # Catch any exception
             self.message_dispatched.emit("Features Worker: " + repr(e), 2)
-        finally:
-            self.finished.emit()
 
-    @pyqtSlot()
-    def stop(self):
-        """Slot to stop the thread's operation safely."""
-        self.abandon = True
+    def _stream(self, feature_ids, flush=False):
+        """Emit the ids appended to feature_ids since the last chunk once there are enough of them"""
+        if not self.streaming:
+            return
+        pending = len(feature_ids) - self.streamed_count
+        if pending >= self.chunk_size or (flush and pending):
+            self.features_chunk_ready.emit(sorted(feature_ids[self.streamed_count :]))
+            self.streamed_count = len(feature_ids)
+            self.chunk_size = min(self.chunk_size * 4, FEATURES_MAX_CHUNK_SIZE)
+
+    def _patchIds(self):
+        """
+        Returns previous_ids patched for the new extent, features in the overlap of both extents are not visited.
+        Like setFilterRect, a feature is in an extent if its bounding box intersects it.
+        """
+        selected_ids = set(self.layer.selectedFeatureIds()) if self.ff_index == 2 else None
+
+        entered = []  # features in the areas that came into view
+        for rect in subtract_rectangle(self.extent, self.previous_extent):
+            for feat in self.layer.getFeatures(self._idsRequest(rect)):
+                if self.abandon:
+                    return None
+                entered.append(feat.id())
+
+        left = set()  # features in the areas that went out of view, unless they still reach into the new extent
+        for rect in subtract_rectangle(self.previous_extent, self.extent):
+            for feat in self.layer.getFeatures(self._idsRequest(rect, with_geometry=True)):
+                if self.abandon:
+                    return None
+                if not feat.geometry().boundingBox().intersects(self.extent):
+                    left.add(feat.id())
+
+        if selected_ids is not None:
+            entered = [f_id for f_id in entered if f_id in selected_ids]
+        return self.previous_ids.patched(left, entered)  # entered ids may already be there from the overlap
+
+    @staticmethod
+    def _idsRequest(rect, with_geometry=False) -> QgsFeatureRequest:
+        """
+        Request for the ids of the features whose bounding box intersects rect.
+        No attributes are read, and unless with_geometry no geometry either: providers test the bounding box
+        on their side (spatial index, SQL) and only return the id.
+        """
+        request = QgsFeatureRequest().setFilterRect(rect).setNoAttributes()
+        if not with_geometry:
+            request.setFlags(QgsFeatureRequest.NoGeometry)
+        return request
+
+
+def subtract_rectangle(rect: QgsRectangle, other: QgsRectangle):
+    """Returns up to four rectangles covering the part of rect that is outside of other"""
+    if not rect.intersects(other):
+        return [rect]
+
+    parts = []
+    x_min, y_min, x_max, y_max = rect.xMinimum(), rect.yMinimum(), rect.xMaximum(), rect.yMaximum()
+    if other.yMaximum() < y_max:  # top band, full width
+        parts.append(QgsRectangle(x_min, other.yMaximum(), x_max, y_max))
+        y_max = other.yMaximum()
+    if other.yMinimum() > y_min:  # bottom band, full width
+        parts.append(QgsRectangle(x_min, y_min, x_max, other.yMinimum()))
+        y_min = other.yMinimum()
+    if other.xMinimum() > x_min:  # left band, between top and bottom
+        parts.append(QgsRectangle(x_min, y_min, other.xMinimum(), y_max))
+    if other.xMaximum() < x_max:  # right band, between top and bottom
+        parts.append(QgsRectangle(other.xMaximum(), y_min, x_max, y_max))
+    return parts
+
+
+def overlap_ratio(rect: QgsRectangle, other: QgsRectangle) -> float:
+    """Area of the intersection relative to the larger of both rectangles, 0 if they do not overlap"""
+    largest = max(rect.area(), other.area())
+    if not largest or not rect.intersects(other):
+        return 0.0
+    return rect.intersect(other).area() / largest
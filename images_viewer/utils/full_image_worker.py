@@ -0,0 +1,36 @@
+from PyQt5.QtCore import pyqtSignal
+from qgis.core import QgsMessageLog
+
+from images_viewer.utils.image_factory import ImageFactory
+from images_viewer.utils.worker_pool import Worker
+
+
+class FullImageWorker(Worker):
+    """Worker loading a sharper image of a feature than its thumbnail when the user zooms in"""
+
+    image_ready = pyqtSignal(object)  # PIL image, None if it could not be loaded
+
+    def __init__(self, field_content, field_type, f_id, box, max_size=None):
+        """
+        field_content is read from the feature in the GUI thread, f_id is only used to log errors.
+        The image is reduced here to fit in box, the pixels it is displayed at, clamped to max_size
+        (GL_MAX_TEXTURE_SIZE), so that the GUI thread uploads it as is.
+        """
+        super().__init__()
+        self.field_content = field_content
+        self.field_type = field_type
+        self.f_id = f_id
+        self.box = tuple(min(d, max_size) for d in box) if max_size else tuple(box)
+
+    def run(self):
+        try:
+            data = ImageFactory.extract_data(self.field_content, self.field_type, max_size=self.box)
+        except Exception as e:
+            QgsMessageLog.logMessage(
+                f"Loading Full Image: Feature Id: {self.f_id} Error: {repr(e)}",
+                "Images Viewer",
+                level=1,
+            )
+            data = None
+        if not self.abandon:
+            self.image_ready.emit(data)
@@ -0,0 +1,98 @@
+import threading
+from dataclasses import dataclass
+from typing import Optional
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from images_viewer.utils.config import (
+    IMAGE_URL_MAX_CONNECTIONS_PER_HOST,
+    IMAGE_URL_REQUEST_BACKOFF,
+    IMAGE_URL_REQUEST_RETRIES,
+    IMGE_URL_REQUEST_TIMEOUT,
+)
+
+
+@dataclass
+class UrlResponse:
+    """Result of HttpSession.get, content is None when the server answered 304 Not Modified"""
+
+    content: Optional[bytes]
+    etag: Optional[str]
+    last_modified: Optional[str]
+
+    @property
+    def not_modified(self) -> bool:
+        return self.content is None
+
+
+class HttpSession:
+    """
+    Pooled HTTP client used to download images.
+    Connections are kept alive and shared by all threads through a single adapter,
+    each thread gets its own requests.Session on top of it since sessions are not thread safe.
+    """
+
+    _instance = None
+    _instance_lock = threading.Lock()
+
+    def __init__(
+        self,
+        timeout=IMGE_URL_REQUEST_TIMEOUT,
+        retries=IMAGE_URL_REQUEST_RETRIES,
+        backoff=IMAGE_URL_REQUEST_BACKOFF,
+        max_connections_per_host=IMAGE_URL_MAX_CONNECTIONS_PER_HOST,
+    ):
+        self._timeout = timeout
+        retry = Retry(
+            total=retries,
+            backoff_factor=backoff,
+            status_forcelist=(429, 500, 502, 503, 504),
+            # a Retry-After of an hour would hold a worker thread for that long, the backoff bounds the wait
+            respect_retry_after_header=False,
+        )
+        # pool_block: threads wait for a free connection instead of opening more than the limit to one host
+        self._adapter = HTTPAdapter(pool_maxsize=max_connections_per_host, pool_block=True, max_retries=retry)
+        self._local = threading.local()
+
+    @classmethod
+    def instance(cls) -> "HttpSession":
+        """Session shared by the whole plugin"""
+        with cls._instance_lock:
+            if cls._instance is None:
+                cls._instance = cls()
+            return cls._instance
+
+    @classmethod
+    def set_instance(cls, session):
+        """Replace the shared session, e.g. by one with shorter timeouts in tests. None goes back to the default"""
+        with cls._instance_lock:
+            cls._instance = session
+
+    def get(self, url, etag=None, last_modified=None) -> UrlResponse:
+        """
+        Download url. If etag or last_modified of a cached copy are given, the request is conditional
+        and the returned content is None if the cached copy is still valid. Raises on HTTP errors.
+        """
+        headers = {}
+        if etag:
+            headers["If-None-Match"] = etag
+        if last_modified:
+            headers["If-Modified-Since"] = last_modified
+
+        response = self._session().get(url, headers=headers, timeout=self._timeout)
+        if response.status_code == 304:
+            return UrlResponse(None, response.headers.get("ETag", etag), last_modified)
+        response.raise_for_status()
+
+        return UrlResponse(response.content, response.headers.get("ETag"), response.headers.get("Last-Modified"))
+
+    def _session(self) -> requests.Session:
+        session = getattr(self._local, "session", None)
+        if session is None:
+            session = requests.Session()
+            session.mount("http://", self._adapter)
+            session.mount("https://", self._adapter)
+            self._local.session = session
+        return session
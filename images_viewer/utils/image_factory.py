@@ -1,71 +1,237 @@
-import io
+import hashlib
 import os
+import time
 from urllib.parse import urlparse
 
 import requests
 from PIL import Image as PILImage
-from PIL.ExifTags import TAGS
 from PyQt5.QtCore import QVariant
+from qgis.core import QgsMessageLog
 
+from images_viewer.decode_process import is_panorama, open_image, reduce_image
+from images_viewer.utils.config import IMAGE_URL_REVALIDATE_AGE, PANORAMA_THUMBNAIL_SCALE
+from images_viewer.utils.decode_pool import DecodeProcessPool
+from images_viewer.utils.http_session import HttpSession
 from images_viewer.widgets import Image360Widget, ImageWidget
 
 
 class ImageFactory:
     @classmethod
-    def extract_data(cls, field_content, field_type):
-        """Given some data and the type of data, convert data to PIL Image"""
+    def extract_data(cls, field_content, field_type, target_size=None, max_size=None):
+        """
+        Given some data and the type of data, convert data to PIL Image ready for upload, see to_texture_pixels.
+        If target_size (width, height) is given the image is decoded at a reduced resolution that fits in it,
+        otherwise the full resolution image is returned, reduced to fit in max_size (width, height) if given.
+        """
+        data = cls._decode(field_content, field_type, target_size, max_size)
+        return cls.to_texture_pixels(data) if data else data
+
+    @classmethod
+    def _decode(cls, field_content, field_type, target_size=None, max_size=None):
+        """extract_data without the conversion to texture pixels, this is what the disk cache stores"""
         if not field_content:
             return None
 
         if field_type == QVariant.ByteArray:
-            data = PILImage.open(io.BytesIO(field_content))
+            source = field_content
         elif field_type == QVariant.String:
             if os.path.isfile(field_content):
-                data = PILImage.open(field_content)
+                source = field_content
             elif urlparse(field_content).scheme in ["http", "https"]:
-                response = requests.get(field_content)
-                data = PILImage.open(io.BytesIO(response.content))
+                source = HttpSession.instance().get(field_content).content
             else:
                 raise ValueError("Invalid photo source. Must be file or url")
         else:
             raise ValueError("Unacceptable field type")
 
+        if target_size:
+            return cls._decode_reduced(source, target_size)
+
+        data = open_image(source)
+        data.info["is_360"] = cls.is_360(data)  # from the header, before the metadata is lost to caching
+        if max_size and (data.width > max_size[0] or data.height > max_size[1]):
+            data = reduce_image(data, max_size)
+        return data
+
+    @classmethod
+    def _decode_reduced(cls, source, target_size):
+        """
+        Open source (bytes or a file path) reduced to target_size. This is where decoding takes time, it runs in
+        the decode processes when they are enabled (DECODE_PROCESSES) and in the calling thread otherwise.
+        """
+        pool = DecodeProcessPool.instance()
+        data = pool.decode(source, target_size, cls.panorama_size(target_size)) if pool else None
+        if data is None:
+            data = open_image(source)
+            data.info["is_360"] = cls.is_360(data)  # from the header, before the metadata is lost to reduce
+            data = cls.reduce(data, target_size)
         return data
 
     @classmethod
-    def create_widget(cls, data):
-        """Creates an Image Widget based on the type of Image Static vs 360"""
-        if cls.is_360(data):
-            return Image360Widget(data)
+    def extract_cached_data(cls, field_content, field_type, target_size, disk_cache, key):
+        """Same as extract_data but looks for the thumbnail in disk_cache (a ThumbnailDiskCache) first"""
+        if not field_content:
+            return None
+
+        if cls.is_url(field_content, field_type):
+            data, _ = cls._cached_url_thumbnail(field_content, target_size, disk_cache, key)
+            # thumbnails made for a larger frame size are also hits, do not keep more pixels than the frame needs
+            return cls.to_texture_pixels(cls.reduce(data, target_size))
+
+        fingerprint = cls.fingerprint(field_content, field_type)
+        data = disk_cache.get(key, fingerprint, target_size)
+        if data is None:
+            data = cls._decode(field_content, field_type, target_size)
+            if data:
+                disk_cache.put(key, fingerprint, target_size, data)
+        elif data:
+            data = cls.reduce(data, target_size)
+
+        return cls.to_texture_pixels(data) if data else data
+
+    @classmethod
+    def cache_thumbnail(cls, field_content, field_type, target_size, disk_cache, key) -> bool:
+        """
+        Make sure disk_cache has the thumbnail, without preparing it for display. Used to warm the cache ahead of time.
+        Returns True if the image was fetched and decoded, False if the cached thumbnail was still good.
+        """
+        if not field_content:
+            return False
+
+        if cls.is_url(field_content, field_type):
+            if disk_cache.contains(key, field_content, target_size):
+                if time.time() - disk_cache.validators(key)[2] < IMAGE_URL_REVALIDATE_AGE:
+                    return False
+            data, downloaded = cls._cached_url_thumbnail(field_content, target_size, disk_cache, key)
+            data.close()
+            return downloaded
+
+        fingerprint = cls.fingerprint(field_content, field_type)
+        if disk_cache.contains(key, fingerprint, target_size):
+            return False
+        data = cls._decode(field_content, field_type, target_size)
+        disk_cache.put(key, fingerprint, target_size, data)
+        data.close()
+        return True
+
+    @classmethod
+    def _cached_url_thumbnail(cls, url, target_size, disk_cache, key):
+        """
+        A cached thumbnail of an url is used as is for IMAGE_URL_REVALIDATE_AGE seconds,
+        after that it is revalidated with a conditional request using the stored ETag/Last-Modified.
+        If the server can't be reached the stale thumbnail is used, it is revalidated again next time.
+        Returns (thumbnail, True if it was downloaded and decoded).
+        """
+        data = disk_cache.get(key, url, target_size)
+        if data is not None:
+            etag, last_modified, validated_at = disk_cache.validators(key)
+            if time.time() - validated_at < IMAGE_URL_REVALIDATE_AGE:
+                return data, False
+            try:
+                response = HttpSession.instance().get(url, etag, last_modified)
+            except requests.RequestException as e:  # offline, DNS, server errors after the retries
+                QgsMessageLog.logMessage(
+                    f"Revalidating {url}: {repr(e)}, using the cached thumbnail", "Images Viewer", level=0
+                )
+                return data, False
+            if response.not_modified:
+                disk_cache.revalidated(key)
+                return data, False
+            data.close()
         else:
-            return ImageWidget(data)
+            response = HttpSession.instance().get(url)
+
+        data = cls._decode_reduced(response.content, target_size)
+        disk_cache.put(key, url, target_size, data, response.etag, response.last_modified)
+
+        return data, True
 
     @staticmethod
-    def is_360(image):
-        """Takes in an image object, returns a boolean indicating whether that image is a 360 image or not"""
-        width, height = image.size
-        exifdata = image.getexif()
-        # looping through all the tags present in exifdata
-        has_gpano = False
-        for tagid in exifdata:
-            # getting the tag name instead of tag id
-            tagname = TAGS.get(tagid, tagid)
-            # passing the tagid to get its respective value
-            value = exifdata.get(tagid)
-            # print(f"{tagname:25}: {value}")
-            if tagname == "XMLPacket":
-                xml = value.decode("utf-8")
-                if "GPano" in xml or "XMP-GPano" in xml:
-                    has_gpano = True
-                break
-        has_360_dimensions = True if width >= height * 2 else False
-        if has_360_dimensions and not has_gpano:
-            # raise ValueError("Unclear whether image is regular or 360")
-            return True
-        elif has_gpano and not has_360_dimensions:
-            # raise ValueError("Unclear whether image is regular or 360")
-            return True
-        elif has_360_dimensions and has_gpano:
-            return True
-        else:
-            return False
+    def is_url(field_content, field_type) -> bool:
+        return (
+            field_type == QVariant.String
+            and not os.path.isfile(field_content)
+            and urlparse(field_content).scheme in ["http", "https"]
+        )
+
+    @staticmethod
+    def fingerprint(field_content, field_type) -> str:
+        """
+        Cheap identifier of the image content that changes when the image changes.
+        Files use modification time and size, BLOBs a hash of the bytes, urls the url itself
+        (url thumbnails are revalidated with the server's ETag/Last-Modified instead).
+        """
+        if field_type == QVariant.ByteArray:
+            return hashlib.sha1(field_content).hexdigest()
+        if os.path.isfile(field_content):
+            stat = os.stat(field_content)
+            return f"{stat.st_mtime_ns}:{stat.st_size}"
+        return field_content
+
+    @classmethod
+    def reduce(cls, image, target_size):
+        """Decode the image at the lowest resolution that fits in target_size, this loads the pixels"""
+        if cls.is_360(image):
+            # only a part of the panorama is visible in the frame, keep enough pixels to look around
+            target_size = cls.panorama_size(target_size)
+
+        return reduce_image(image, target_size)
+
+    @staticmethod
+    def panorama_size(target_size):
+        """Size 360 images are reduced to for a frame of target_size, zooming in loads the full image"""
+        width = target_size[0] * PANORAMA_THUMBNAIL_SCALE
+        return (width, width // 2)
+
+    @staticmethod
+    def to_texture_pixels(image):
+        """
+        Converts the image to RGBA backed by one contiguous buffer, image.info["texture_pixels"],
+        that the widgets hand to glTexImage2D as is. This runs in the workers so the GUI thread does not copy pixels.
+        High bit depth grayscale is stretched to 8 bits, palette, CMYK and other modes are converted.
+        """
+        info = dict(image.info)
+        size = image.size
+        if image.mode.startswith("I;16"):  # 16 bit TIFF/PNG, getextrema and point fail on the big endian modes
+            image = image.convert("I")
+        if image.mode in ("I", "F"):
+            low, high = image.getextrema()
+            scale = 255 / (high - low) if high > low else 0
+            image = image.point(lambda i: (i - low) * scale).convert("L")
+        if image.mode != "RGBA":
+            try:
+                image = image.convert("RGBA")  # P with transparency, LA and PA keep their alpha
+            except ValueError:  # e.g. LAB, no direct conversion
+                image = image.convert("RGB").convert("RGBA")
+
+        pixels = image.tobytes()
+        # the image shares the buffer, the pixels are held only once
+        texture_image = PILImage.frombuffer("RGBA", size, pixels, "raw", "RGBA", 0, 1)
+        texture_image.info = info
+        texture_image.info["texture_pixels"] = pixels
+        return texture_image
+
+    @classmethod
+    def create_widget(cls, data, full_image_loader=None):
+        """
+        Creates an Image Widget based on the type of Image Static vs 360.
+        full_image_loader(on_ready, box) loads a sharper image fitting in box in the background when the user
+        zooms in past the resolution of data, then calls on_ready with it.
+        """
+        return cls.widget_class(data)(data, full_image_loader)
+
+    @classmethod
+    def widget_class(cls, data):
+        """Image360Widget or ImageWidget, the class create_widget uses for data"""
+        return Image360Widget if cls.is_360(data) else ImageWidget
+
+    @staticmethod
+    def is_360(image) -> bool:
+        """
+        Takes in an image object, returns a boolean indicating whether that image is a 360 image or not.
+        Only the header is read, the result is kept in image.info["is_360"] by the workers and the disk cache.
+        GPano metadata decides if present, otherwise an equirectangular image is 2:1.
+        """
+        if "is_360" in image.info:
+            return image.info["is_360"]
+        return is_panorama(image)
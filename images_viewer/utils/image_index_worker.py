@@ -0,0 +1,44 @@
+from PyQt5.QtCore import QVariant, pyqtSignal
+from qgis.core import QgsExpression, QgsFeatureRequest
+
+from images_viewer.utils.feature_index import FeatureIdSet
+from images_viewer.utils.worker_pool import Worker
+
+
+def has_image_expression(image_field, field_type) -> str:
+    """Filter matching the features whose image field is set, simple enough for providers to run it in SQL"""
+    column = QgsExpression.quotedColumnRef(image_field)
+    if field_type == QVariant.String:
+        return f"{column} IS NOT NULL AND {column} <> ''"
+    return f"{column} IS NOT NULL"
+
+
+class ImageIndexWorker(Worker):
+    """Worker to find, with a single query, which features of the layer have a value in the image field"""
+
+    index_ready = pyqtSignal(object)  # FeatureIdSet
+    message_dispatched = pyqtSignal(str, int)
+
+    def __init__(self, layer, image_field, field_type):
+        super().__init__()
+        self.layer = layer
+        self.image_field = image_field
+        self.field_type = field_type
+
+    def run(self):
+        try:
+            request = QgsFeatureRequest().setFilterExpression(has_image_expression(self.image_field, self.field_type))
+            request.setNoAttributes()  # the filter is evaluated by the provider, only ids come back
+            request.setFlags(QgsFeatureRequest.NoGeometry)
+
+            image_index = FeatureIdSet()
+            for feat in self.layer.getFeatures(request):
+                if self.abandon:
+                    return
+                image_index.add(feat.id())
+
+            if not self.abandon:
+                self.index_ready.emit(image_index)
+
+        except Exception as e:
+            self.message_dispatched.emit("Image Index Worker: " + repr(e), 2)
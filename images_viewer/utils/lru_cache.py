@@ -48,41 +48,111 @@ class LRUCache:
         with self._lock:
             return len(self._cache)
 
+    def values(self) -> list:
+        with self._lock:
+            return list(self._cache.values())
+
     def capacity(self):
         return self._capacity
 
 
-class WidgetLRUCache(LRUCache):
-    """Apply widget.deleteLater() method to the widget at deletion"""
+class SizedLRUCache(LRUCache):
+    """
+    LRU cache bounded by the memory used by its values as well as by their count.
+    Pinned keys, the features in the grid and the page being loaded for it, are never evicted, even when they alone
+    are over budget. Subclasses define sizeOf and release.
+    """
 
-    def put(self, key: Any, value: Any) -> Any:
+    def __init__(self, capacity: int, max_bytes: int):
+        super().__init__(capacity)
+        self._max_bytes = max_bytes
+        self._pinned = set()
+
+    def sizeOf(self, value: Any) -> int:
+        """Estimated bytes used by value"""
+        return 0
+
+    def release(self, value: Any):
+        """Called with evicted values"""
+        pass
+
+    # sizes are computed when needed rather than stored at put,
+    # values such as frames may grow after they are cached (e.g. full resolution image loaded on zoom)
+    def put(self, key: Any, value: Any, pin: bool = False) -> Any:
         with self._lock:
             self._cache[key] = value
             self._cache.move_to_end(key)
-            if len(self._cache) > self._capacity:
-                _, v = self._cache.popitem(last=False)
-                v.deleteLater()
-
-    def clear(self) -> Any:
+            if pin:
+                self._pinned.add(key)
+
+            usage = sum(self.sizeOf(v) for v in self._cache.values())
+            for k in [k for k in self._cache if k not in self._pinned]:  # least recently used first
+                if len(self._cache) <= self._capacity and usage <= self._max_bytes:
+                    break
+                v = self._cache.pop(k)
+                usage -= self.sizeOf(v)
+                self.release(v)
+
+    def pin(self, key: Any) -> bool:
+        """Keep key from being evicted until the pins are reset, returns False if key is not cached"""
         with self._lock:
-            for v in self._cache.values():
-                v.deleteLater()
-            self._cache.clear()
-
+            if key not in self._cache:
+                return False
+            self._pinned.add(key)
+            return True
 
-class FeatureDataLRUCache(LRUCache):
-    """Apply data.close() method to the image data at deletion"""
+    def setPinned(self, keys):
+        """Only keep keys from being evicted, the pins of keys not in it are removed"""
+        with self._lock:
+            self._pinned = set(keys)
 
-    def put(self, key: Any, value: Any) -> Any:
+    def take(self, key: Any) -> Any:
+        """Remove key and return its value without releasing it, the caller becomes its owner"""
         with self._lock:
-            self._cache[key] = value
-            self._cache.move_to_end(key)
-            if len(self._cache) > self._capacity:
-                _, v = self._cache.popitem(last=False)
-                v.data.close()
+            self._pinned.discard(key)
+            return self._cache.pop(key)
 
     def clear(self) -> Any:
         with self._lock:
             for v in self._cache.values():
-                v.data.close()
+                self.release(v)
             self._cache.clear()
+            self._pinned.clear()
+
+    def usage(self) -> int:
+        """Estimated bytes used by all values"""
+        with self._lock:
+            return sum(self.sizeOf(v) for v in self._cache.values())
+
+    def maxBytes(self) -> int:
+        return self._max_bytes
+
+
+class WidgetLRUCache(SizedLRUCache):
+    """Apply widget.deleteLater() method to the widget at deletion, size is the widget's memoryUsage()"""
+
+    def sizeOf(self, value: Any) -> int:
+        return value.memoryUsage()
+
+    def release(self, value: Any):
+        value.deleteLater()
+
+
+class FeatureDataLRUCache(SizedLRUCache):
+    """
+    Size is the decoded pixels of the image data. Evicted images are not closed, a frame may still show them:
+    their pixels are freed once the last frame holding them lets go.
+    """
+
+    def sizeOf(self, value: Any) -> int:
+        return image_bytes(value.data)
+
+    def release(self, value: Any):
+        pass
+
+
+def image_bytes(image) -> int:
+    """Memory used by the pixels of a PIL image, PIL stores 3 bands images with 4 bytes per pixel"""
+    width, height = image.size
+    bytes_per_pixel = {"1": 1, "L": 1, "P": 1, "I;16": 2}.get(image.mode, 4)
+    return width * height * bytes_per_pixel
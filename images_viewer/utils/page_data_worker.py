@@ -1,11 +1,20 @@
+from concurrent.futures import ThreadPoolExecutor
 from dataclasses import dataclass
 from typing import List
 
 from PIL import Image as PILImage
-from PyQt5.QtCore import QThread, pyqtSignal, pyqtSlot
-from qgis.core import QgsExpression, QgsExpressionContext, QgsFeature, QgsMessageLog
+from PyQt5.QtCore import pyqtSignal
+from qgis.core import (
+    NULL,
+    QgsExpression,
+    QgsExpressionContext,
+    QgsFeature,
+    QgsFeatureRequest,
+    QgsMessageLog,
+)
 
-from images_viewer.utils import ImageFactory
+from images_viewer.utils import IMAGE_FETCH_CONCURRENCY, ImageFactory
+from images_viewer.utils.worker_pool import Worker
 
 
 @dataclass
@@ -18,8 +27,8 @@ class FeatureData:
     children: List[QgsFeature]
 
 
-class PageDataWorker(QThread):
-    """Thread to get data for the page based on page_start index"""
+class PageDataWorker(Worker):
+    """Worker to get data for the page based on page_start index"""
 
     page_ready = pyqtSignal(int, int, list)  # page start, next page start, page_f_ids
     message_dispatched = pyqtSignal(str, int)
@@ -38,8 +47,13 @@ class PageDataWorker(QThread):
         page_size,
         relation,
         reverse=False,
+        thumbnail_size=None,
+        disk_cache=None,
+        executor=None,
+        image_index=None,
+        pin_page=False,
     ):
-        super(QThread, self).__init__()
+        super().__init__()
         self.layer = layer
         self.feature_ids = feature_ids
         self.features_none_data_cache = features_none_data_cache
@@ -52,7 +66,14 @@ class PageDataWorker(QThread):
         self.page_size = page_size
         self.relation = relation
         self.reverse = reverse
-        self.abandon = False
+        self.thumbnail_size = thumbnail_size  # (width, height) to decode images at, None for full resolution
+        self.disk_cache = disk_cache  # ThumbnailDiskCache, only used with a thumbnail_size
+        # images of a page are fetched and decoded concurrently in this pool, if None a pool is created per run
+        self.executor = executor
+        # FeatureIdSet of the features with an image, features not in it are skipped without being fetched
+        self.image_index = image_index
+        # the workers of the grid pin the data of their page, so that it is not evicted before the grid shows it
+        self.pin_page = pin_page
 
     def run(self):
         """There must be at least one element in feature_ids"""
@@ -64,6 +85,8 @@ class PageDataWorker(QThread):
             display_expression = self.layer.displayExpression()
             feature_title_expression = QgsExpression(display_expression)
             context = QgsExpressionContext()
+            image_layer_id = self.relation.referencingLayer().id() if self.relation else self.layer.id()
+            features_request = self._featuresRequest(feature_title_expression)
 
             # although it is not expected the page_start to be less than 0 but this is a safeguard
             # if for some error page_start is less than 0
@@ -79,67 +102,97 @@ class PageDataWorker(QThread):
                 feature_range = range(self.page_start - 1, -1, -1)
 
             page_f_ids = []
-            error_occured = False
-
-            count = 0
-
-            for i in feature_range:
-                if self.abandon:
-                    # print("!!!abondoning page worker")
-                    return
-
-                if len(page_f_ids) >= self.page_size:
-                    break
-
-                count += 1
-                f_id = self.feature_ids[i]
-
-                if any(
-                    [self.features_data_cache.keyExist(f_id), self.features_frames_cache.keyExist(f_id)]
-                ):  # cache hit: do not extract data again
-                    page_f_ids.append(f_id)
-                    continue
-                if any(
-                    [f_id in self.features_none_data_cache, f_id in self.features_broken_data_cache]
-                ):  # cache hit: this feature has no/corrupt data
-                    continue
-                try:
-                    feature = self.layer.getFeature(f_id)
-
-                    # doing this at the top so that if this fails we short circuit
-                    data = None
-                    field_content = None
-                    child_features = []
-
-                    if not self.relation:
-                        field_content = feature[self.image_field]
-                    else:
-                        # get features from the child layer and get the first one
-                        child_features = [f for f in self.relation.getRelatedFeatures(feature)]
-                        if child_features:
-                            first_child_feature = child_features[0]  # take first child feature
-                            field_content = first_child_feature[self.image_field]
-
-                    data = ImageFactory.extract_data(field_content, self.field_type)
-
-                    if not data:  # feature with no image data
-                        self.features_none_data_cache.add(f_id)
-                    else:
-                        context.setFeature(feature)
-                        f_data = FeatureData(feature, feature_title_expression.evaluate(context), data, child_features)
-                        page_f_ids.append(f_id)
-                        self.features_data_cache.put(f_id, f_data)
-
-                except Exception as e:
-                    error_occured = True
-                    self.features_broken_data_cache.add(
-                        f_id
-                    )  # features with corrupt data should not be evaluated again
-                    QgsMessageLog.logMessage(
-                        f"Extracting Data: Feature Id: {f_id} Error: {repr(e)}",
-                        "Images Viewer",
-                        level=2,
-                    )  # not sure if this is thread safe
+            self.error_occured = False
+
+            count = 0  # number of features looked at, including the ones without image
+
+            executor = self.executor or ThreadPoolExecutor(max_workers=IMAGE_FETCH_CONCURRENCY)
+            try:
+                while len(page_f_ids) < self.page_size and count < len(feature_range):
+                    # take just enough features to fill the page if all of them turn out to have an image,
+                    # so that the page ends exactly where the sequential scan would end it
+                    batch = []  # f_ids in paging order, including cache hits
+                    fetch_f_ids = []  # f_ids whose data is not in cache
+                    while len(page_f_ids) + len(batch) < self.page_size and count < len(feature_range):
+                        if self.abandon:
+                            # print("!!!abondoning page worker")
+                            return
+
+                        f_id = self.feature_ids[feature_range[count]]
+                        count += 1
+
+                        if self.pin_page:
+                            cached = self.features_data_cache.pin(f_id)
+                        else:
+                            cached = self.features_data_cache.keyExist(f_id)
+                        if cached or self.features_frames_cache.keyExist(f_id):  # cache hit: do not extract data again
+                            batch.append(f_id)
+                            continue
+                        if any(
+                            [f_id in self.features_none_data_cache, f_id in self.features_broken_data_cache]
+                        ):  # cache hit: this feature has no/corrupt data
+                            continue
+                        if self.image_index is not None and f_id not in self.image_index:  # no image, known upfront
+                            continue
+                        batch.append(f_id)
+                        fetch_f_ids.append(f_id)
+
+                    # one provider query for the whole batch, features are handed to the pool as they arrive
+                    # the layer is not thread safe, only fetching and decoding the image runs in the pool
+                    pending = {}  # f_id: (feature, child_features, future)
+                    if fetch_f_ids:
+                        request = QgsFeatureRequest(features_request).setFilterFids(fetch_f_ids)
+                        features = self.layer.getFeatures(request)
+                        children = {}
+                        if self.relation:
+                            # children of all the parents in the batch are fetched with a single query
+                            features = list(features)
+                            children = self._getChildren(features)
+                        for feature in features:
+                            if self.abandon:
+                                self._cancel(pending)
+                                return
+                            try:
+                                child_features, image_f_id, field_content = self._getImageSource(feature, children)
+                                future = executor.submit(self._extractData, image_layer_id, image_f_id, field_content)
+                                pending[feature.id()] = (feature, child_features, future)
+                            except Exception as e:
+                                self._markBroken(feature.id(), e)
+
+                    for f_id in batch:
+                        if self.abandon:
+                            self._cancel(pending)
+                            return
+
+                        if f_id not in pending:
+                            if f_id in self.features_broken_data_cache:
+                                continue
+                            if f_id in fetch_f_ids:  # provider did not return it
+                                self._markBroken(f_id, KeyError("Feature not found"))
+                            else:  # cache hit
+                                page_f_ids.append(f_id)
+                            continue
+
+                        feature, child_features, future = pending[f_id]
+                        try:
+                            data = future.result()
+                            if self.abandon:  # data may be None because the fetch was skipped
+                                self._cancel(pending)
+                                return
+                            if not data:  # feature with no image data
+                                self.features_none_data_cache.add(f_id)
+                            else:
+                                context.setFeature(feature)
+                                f_data = FeatureData(
+                                    feature, feature_title_expression.evaluate(context), data, child_features
+                                )
+                                page_f_ids.append(f_id)
+                                self.features_data_cache.put(f_id, f_data, self.pin_page)
+                        except Exception as e:
+                            self._markBroken(f_id, e)
+            finally:
+                if executor is not self.executor:
+                    executor.shutdown(wait=False)
 
             if self.reverse:
                 page_f_ids.reverse()
@@ -150,7 +203,7 @@ class PageDataWorker(QThread):
             if not self.abandon:  # Check if the thread should be abandoned
                 self.page_ready.emit(self.page_start, next_page_start, page_f_ids)
 
-            if error_occured:
+            if self.error_occured:
                 self.message_dispatched.emit(
                     "Extracting Data: Unable to get image data from all features. See logs for details.", 1
                 )
@@ -158,7 +211,108 @@ class PageDataWorker(QThread):
         except Exception as e:  # Catch any exception
             self.message_dispatched.emit("Extracting Data: " + repr(e), 2)
 
-    @pyqtSlot()
-    def stop(self):
-        """Slot to stop the thread's operation safely."""
-        self.abandon = True
+    def _featuresRequest(self, feature_title_expression) -> QgsFeatureRequest:
+        """Request fetching only what is needed to build frames: the image (or relation) fields and title columns"""
+        request = QgsFeatureRequest()
+        if not self.layer.isSpatial():
+            request.setFlags(QgsFeatureRequest.NoGeometry)
+
+        columns = set(feature_title_expression.referencedColumns())
+        if self.relation:
+            columns.update(self.relation.fieldPairs().values())  # parent fields the children refer to
+        else:
+            columns.add(self.image_field)
+        if QgsFeatureRequest.ALL_ATTRIBUTES not in columns:
+            request.setSubsetOfAttributes(list(columns), self.layer.fields())
+
+        return request
+
+    def _getImageSource(self, feature, children):
+        """
+        Returns the feature's children, id of the feature holding the image and the image field content.
+        children is the output of _getChildren in relation mode.
+        """
+        field_content = None
+        image_f_id = None
+        child_features = []
+
+        if not self.relation:
+            field_content = feature[self.image_field]
+            image_f_id = feature.id()
+        else:
+            # get features from the child layer and get the first one
+            child_features = children.get(self._relationKey(feature, self.relation.fieldPairs().values()), [])
+            if child_features:
+                first_child_feature = child_features[0]  # take first child feature
+                field_content = first_child_feature[self.image_field]
+                image_f_id = first_child_feature.id()
+
+        return child_features, image_f_id, field_content
+
+    def _getChildren(self, parent_features):
+        """
+        Fetch the children of all parent_features with one query on the child layer.
+        Returns {relation key: [child features]}, only the image field and the child title columns are fetched.
+        """
+        field_pairs = self.relation.fieldPairs()  # {child (referencing) field: parent (referenced) field}
+        referencing_fields = list(field_pairs.keys())
+        referenced_fields = [field_pairs[f] for f in referencing_fields]
+
+        if len(referencing_fields) == 1:
+            values = {parent[referenced_fields[0]] for parent in parent_features}
+            values = [QgsExpression.quotedValue(v) for v in values if v != NULL]
+            if not values:
+                return {}
+            expression = f"{QgsExpression.quotedColumnRef(referencing_fields[0])} IN ({', '.join(values)})"
+        else:  # composite keys can't be expressed with IN
+            expression = " OR ".join(f"({self.relation.getRelatedFeaturesFilter(p)})" for p in parent_features)
+
+        child_layer = self.relation.referencingLayer()
+        child_title_expression = QgsExpression(child_layer.displayExpression())
+        request = QgsFeatureRequest().setFilterExpression(expression)
+        if not child_title_expression.needsGeometry():
+            request.setFlags(QgsFeatureRequest.NoGeometry)
+        columns = {self.image_field, *referencing_fields, *child_title_expression.referencedColumns()}
+        if QgsFeatureRequest.ALL_ATTRIBUTES not in columns:
+            request.setSubsetOfAttributes(list(columns), child_layer.fields())
+
+        children = {}
+        for child_feature in child_layer.getFeatures(request):
+            if self.abandon:
+                break
+            children.setdefault(self._relationKey(child_feature, referencing_fields), []).append(child_feature)
+
+        return children
+
+    @staticmethod
+    def _relationKey(feature, fields):
+        # compare as strings, the provider may type the parent and child fields differently
+        return tuple(str(feature[f]) for f in fields)
+
+    @staticmethod
+    def _cancel(pending):
+        for *_, future in pending.values():
+            future.cancel()
+
+    def _extractData(self, image_layer_id, image_f_id, field_content):
+        """Runs in the executor's threads"""
+        if self.abandon:
+            return None
+        if self.disk_cache and self.thumbnail_size:
+            return ImageFactory.extract_cached_data(
+                field_content,
+                self.field_type,
+                self.thumbnail_size,
+                self.disk_cache,
+                self.disk_cache.key(image_layer_id, self.image_field, image_f_id),
+            )
+        return ImageFactory.extract_data(field_content, self.field_type, self.thumbnail_size)
+
+    def _markBroken(self, f_id, e):
+        self.error_occured = True
+        self.features_broken_data_cache.add(f_id)  # features with corrupt data should not be evaluated again
+        QgsMessageLog.logMessage(
+            f"Extracting Data: Feature Id: {f_id} Error: {repr(e)}",
+            "Images Viewer",
+            level=2,
+        )  # not sure if this is thread safe
@@ -0,0 +1,97 @@
+import bisect
+from array import array
+
+from PyQt5.QtCore import pyqtSignal
+
+from images_viewer.utils.config import PAGE_INDEX_FIRST_CHUNK
+from images_viewer.utils.worker_pool import Worker
+
+
+class PageIndex:
+    """
+    Start indexes in feature_ids of the pages, page n starts at starts[n].
+    Pages found by a forward scan from the start of the page before them start at the same index,
+    so a page can be shown directly instead of walking every page before it.
+    An index is complete once the start of the last page is known.
+    """
+
+    def __init__(self, starts=None, complete=False):
+        self.starts = starts if starts is not None else array("q", [0])
+        self.complete = complete
+
+    def pageCount(self) -> int:
+        """Number of pages known so far"""
+        return len(self.starts)
+
+    def pageStart(self, page):
+        """Start index of page, None if it is not known (yet)"""
+        return self.starts[page] if 0 <= page < len(self.starts) else None
+
+    def pageOf(self, index) -> int:
+        """Number of the page showing feature_ids[index], or of the last known page before it"""
+        return max(bisect.bisect_right(self.starts, index) - 1, 0)
+
+    def pageNumber(self, page_start):
+        """Number of the page starting at page_start, None if no page starts there"""
+        page = bisect.bisect_left(self.starts, page_start)
+        return page if page < len(self.starts) and self.starts[page] == page_start else None
+
+    def record(self, page_start, next_page_start, feature_count):
+        """Learn the start of the next page from a forward scan, used when the index is not built upfront"""
+        if self.complete or page_start != self.starts[-1] or next_page_start <= page_start:
+            return
+        if next_page_start >= feature_count:
+            self.complete = True
+        else:
+            self.starts.append(next_page_start)
+
+
+class PageIndexWorker(Worker):
+    """
+    Worker to find the start of every page, from the index of features with an image instead of fetching features.
+    Partial indexes are emitted while walking, so jumping to the first pages works before the walk is over.
+    """
+
+    page_index_ready = pyqtSignal(object)  # PageIndex
+    message_dispatched = pyqtSignal(str, int)
+
+    def __init__(self, feature_ids, image_index, features_none_data_cache, features_broken_data_cache, page_size):
+        super().__init__()
+        self.feature_ids = feature_ids
+        self.image_index = image_index
+        self.features_none_data_cache = features_none_data_cache
+        self.features_broken_data_cache = features_broken_data_cache
+        self.page_size = page_size
+
+    def run(self):
+        try:
+            starts = array("q")
+            next_start = 0  # start of the page after the last full page, added once it has a feature
+            count = 0  # features with an image so far
+            emit_at = PAGE_INDEX_FIRST_CHUNK
+
+            for index, f_id in enumerate(self.feature_ids):
+                if self.abandon:
+                    return
+                if (
+                    f_id not in self.image_index
+                    or f_id in self.features_none_data_cache
+                    or f_id in self.features_broken_data_cache
+                ):
+                    continue
+                if next_start is not None:
+                    starts.append(next_start)
+                    next_start = None
+                count += 1
+                if count % self.page_size == 0:
+                    next_start = index + 1
+
+                if len(starts) >= emit_at:
+                    self.page_index_ready.emit(PageIndex(array("q", starts)))
+                    emit_at *= 4
+
+            if not self.abandon:
+                self.page_index_ready.emit(PageIndex(starts or array("q", [0]), complete=True))
+
+        except Exception as e:
+            self.message_dispatched.emit("Page Index Worker: " + repr(e), 2)
@@ -0,0 +1,71 @@
+from PyQt5.QtCore import QObject, pyqtSlot
+
+from images_viewer.utils.config import PREFETCH_PAGES_AHEAD, PREFETCH_PAGES_BEHIND
+from images_viewer.utils.worker_pool import SPECULATIVE_PRIORITY
+
+
+class PagePrefetcher(QObject):
+    """
+    Keeps the data of the pages around the visible page warm in the caches.
+    Pages ahead are chained from the next page start of the page before them, pages behind are found with reverse
+    scans from the start of the page after them. Speculative work runs one page at a time with the lowest priority
+    in the worker pool, it is started once the visible page is ready and cancelled as soon as the visible page changes.
+    """
+
+    def __init__(
+        self, create_worker, worker_pool, pages_ahead=PREFETCH_PAGES_AHEAD, pages_behind=PREFETCH_PAGES_BEHIND
+    ):
+        """create_worker(page_start, reverse) must return a PageDataWorker that is not started"""
+        super().__init__()
+        self.create_worker = create_worker
+        self.worker_pool = worker_pool
+        self.pages_ahead = pages_ahead
+        self.pages_behind = pages_behind
+        self.feature_count = 0
+        self.queue = []  # (distance from the visible page, page_start, reverse)
+        self.task = None  # TaskHandle of the page being prefetched
+
+    def schedule(self, page_start, next_page_start, feature_count):
+        """The page [page_start, next_page_start) is visible, start warming the pages around it"""
+        self.cancel()
+        self.feature_count = feature_count
+        if self.pages_ahead and next_page_start < feature_count:
+            self.queue.append((1, next_page_start, False))
+        if self.pages_behind and page_start > 0:
+            self.queue.append((1, page_start, True))
+        self._startNext()
+
+    @pyqtSlot()
+    def cancel(self):
+        """Drop all speculative work, the running worker is abandoned"""
+        self.queue.clear()
+        if self.task:
+            task, self.task = self.task, None
+            task.cancel()
+
+    def _startNext(self):
+        if self.task or not self.queue:
+            return
+
+        self.queue.sort(key=lambda item: item[0])  # closest pages first, ahead before behind
+        distance, page_start, reverse = self.queue.pop(0)
+
+        worker = self.create_worker(page_start, reverse)
+        worker.page_ready.connect(
+            lambda start, next_start, _: self._onPageReady(worker, distance, reverse, start, next_start)
+        )
+        worker.finished.connect(lambda: self._onWorkerFinished(worker))
+        self.task = self.worker_pool.start(worker, SPECULATIVE_PRIORITY)
+
+    def _onPageReady(self, worker, distance, reverse, page_start, next_page_start):
+        if not self.task or worker is not self.task.worker:  # cancelled
+            return
+        if not reverse and distance < self.pages_ahead and next_page_start < self.feature_count:
+            self.queue.append((distance + 1, next_page_start, False))
+        elif reverse and distance < self.pages_behind and page_start > 0:
+            self.queue.append((distance + 1, page_start, True))
+
+    def _onWorkerFinished(self, worker):
+        if self.task and worker is self.task.worker:
+            self.task = None
+            self._startNext()
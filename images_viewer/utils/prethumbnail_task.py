@@ -0,0 +1,201 @@
+import bisect
+import hashlib
+import time
+from array import array
+from concurrent.futures import ThreadPoolExecutor
+
+from PyQt5.QtCore import QSettings
+from qgis.core import QgsFeatureRequest, QgsMessageLog, QgsTask, QgsVectorLayerFeatureSource
+
+from images_viewer.utils.config import IMAGE_FETCH_CONCURRENCY, PRETHUMBNAIL_BATCH_SIZE, PRETHUMBNAIL_CACHE_FILL
+from images_viewer.utils.image_factory import ImageFactory
+from images_viewer.utils.image_index_worker import has_image_expression
+from images_viewer.utils.thumbnail_cache import ThumbnailDiskCache
+
+
+class PrethumbnailTask(QgsTask):
+    """
+    Background task filling the thumbnail disk cache with the images of a layer ahead of a review session,
+    so that the viewer does not wait on the network or on decoding afterwards.
+    Ids of the features with an image are enumerated first without attributes or geometry, like FeaturesWorker,
+    then the images are fetched by batches and decoded by a pool of threads (and the decode processes if enabled).
+    Ids are visited in order and the last id of every finished batch is saved in the settings,
+    a cancelled or failed run can be resumed from there.
+
+    The task stops once it wrote PRETHUMBNAIL_CACHE_FILL of the disk cache capacity, beyond that it would evict
+    the thumbnails it made first. It opens its own ThumbnailDiskCache on the index the open dialogs use:
+    each instance keeps its own usage, they are re-synced from the index whenever one of them evicts.
+    """
+
+    def __init__(
+        self,
+        iface,
+        layer,
+        image_field,
+        field_type,
+        thumbnail_size,
+        filter_expression="",
+        selected_only=False,
+        resume=False,
+    ):
+        super().__init__(f"Pre-thumbnail images of {layer.name()}", QgsTask.CanCancel)
+        self.iface = iface
+        self.layer_id = layer.id()
+        self.layer_name = layer.name()
+        self.fields = layer.fields()
+        # the layer must not be used from the task's thread, features are read from a copy of its source
+        self.source = QgsVectorLayerFeatureSource(layer)
+        self.image_field = image_field
+        self.field_type = field_type
+        self.thumbnail_size = thumbnail_size
+        self.filter_expression = filter_expression
+        self.selected_ids = set(layer.selectedFeatureIds()) if selected_only else None
+
+        self.checkpoint_key = self.checkpointKey(image_field, filter_expression, selected_only)
+        self.checkpoint = None  # ids up to this one are skipped
+        if resume:
+            self.checkpoint = self.savedCheckpoint(layer, image_field, filter_expression, selected_only)
+
+        # summary, see finished
+        self.total = 0
+        self.skipped = 0  # visited by the run that was resumed
+        self.decoded = 0
+        self.cached = 0
+        self.failed = 0
+        self.written_bytes = 0
+        self.evicted = 0  # older thumbnails evicted to make room
+        self.cache_full = False
+        self.elapsed = 0.0
+        self.exception = None
+
+    @staticmethod
+    def checkpointKey(image_field, filter_expression, selected_only) -> str:
+        """Settings key of the checkpoint of a run, runs over other features or fields have their own"""
+        scope = "selected" if selected_only else filter_expression
+        digest = hashlib.sha1(f"{image_field}\0{scope}".encode("utf-8")).hexdigest()[:16]
+        return f"prethumbnailCheckpoint/{digest}"
+
+    @classmethod
+    def savedCheckpoint(cls, layer, image_field, filter_expression="", selected_only=False):
+        """Last feature id done by a previous run that did not finish, None if there is none"""
+        settings = QSettings("QGIS3 - Images Viewer", layer.name())
+        value = settings.value(cls.checkpointKey(image_field, filter_expression, selected_only))
+        return int(value) if value is not None else None
+
+    def run(self):
+        start_time = time.time()
+        settings = QSettings("QGIS3 - Images Viewer", self.layer_name)  # QSettings are not shared between threads
+        disk_cache = ThumbnailDiskCache()
+        max_written = disk_cache.capacity() * PRETHUMBNAIL_CACHE_FILL
+        executor = ThreadPoolExecutor(IMAGE_FETCH_CONCURRENCY, thread_name_prefix="ImagesViewerPrethumbnail")
+        try:
+            f_ids = self._featureIds()
+            if f_ids is None:
+                return False
+            self.total = len(f_ids)
+            start = bisect.bisect_right(f_ids, self.checkpoint) if self.checkpoint is not None else 0
+            self.skipped = start
+
+            request = QgsFeatureRequest().setFlags(QgsFeatureRequest.NoGeometry)
+            request.setSubsetOfAttributes([self.image_field], self.fields)
+
+            for batch_start in range(start, len(f_ids), PRETHUMBNAIL_BATCH_SIZE):
+                batch = f_ids[batch_start : batch_start + PRETHUMBNAIL_BATCH_SIZE]
+                pending = []  # (f_id, future)
+                # one provider query for the batch, only fetching and decoding the images runs in the pool
+                for feature in self.source.getFeatures(QgsFeatureRequest(request).setFilterFids(list(batch))):
+                    if self.isCanceled():
+                        return False
+                    key = ThumbnailDiskCache.key(self.layer_id, self.image_field, feature.id())
+                    future = executor.submit(
+                        ImageFactory.cache_thumbnail,
+                        feature[self.image_field],
+                        self.field_type,
+                        self.thumbnail_size,
+                        disk_cache,
+                        key,
+                    )
+                    pending.append((feature.id(), future))
+
+                for f_id, future in pending:
+                    if self.isCanceled():
+                        return False
+                    try:
+                        if future.result():
+                            self.decoded += 1
+                        else:
+                            self.cached += 1
+                    except Exception as e:
+                        self.failed += 1
+                        QgsMessageLog.logMessage(
+                            f"Pre-thumbnail: Feature Id: {f_id} Error: {repr(e)}", "Images Viewer", level=1
+                        )
+                    self.setProgress(100 * (start + self.decoded + self.cached + self.failed) / self.total)
+                    if disk_cache.written() >= max_written:
+                        # the checkpoint of the previous batch is kept, a run after the cache is raised resumes
+                        self.cache_full = True
+                        return False
+
+                settings.setValue(self.checkpoint_key, batch[-1])
+
+            settings.remove(self.checkpoint_key)  # done, the next run starts over
+            return True
+
+        except Exception as e:
+            self.exception = e
+            return False
+
+        finally:
+            executor.shutdown(wait=True, cancel_futures=True)  # running fetches finish before the cache is closed
+            self.written_bytes = disk_cache.written()
+            self.evicted = disk_cache.evicted()
+            disk_cache.close()
+            self.elapsed = time.time() - start_time
+
+    def _featureIds(self):
+        """Sorted ids of the features with an image, in the selection or matching the filter if any"""
+        expression = has_image_expression(self.image_field, self.field_type)
+        if self.filter_expression:
+            expression = f"({expression}) AND ({self.filter_expression})"
+        request = QgsFeatureRequest().setFilterExpression(expression)
+        request.setNoAttributes()  # columns of the filter are still read when the provider can't run it in SQL
+        request.setFlags(QgsFeatureRequest.NoGeometry)
+
+        f_ids = array("q")
+        for feature in self.source.getFeatures(request):
+            if self.isCanceled():
+                return None
+            # a request can't filter by ids and by expression at once, the selection is applied here
+            if self.selected_ids is None or feature.id() in self.selected_ids:
+                f_ids.append(feature.id())
+        return array("q", sorted(f_ids))
+
+    def finished(self, result):
+        """Runs in the main thread, reports what was done"""
+        processed = self.decoded + self.cached + self.failed
+        rate = processed / self.elapsed if self.elapsed else 0
+        summary = (
+            f"{self.decoded} thumbnails made, {self.cached} already cached, {self.failed} failed "
+            f"of {self.total} images in {self.elapsed:.0f} s ({rate:.1f} images/s, "
+            f"{self.written_bytes / (1024 * 1024):.0f} MB written to the cache)"
+        )
+        if self.skipped:
+            summary += f", {self.skipped} done by the previous run"
+        if self.evicted:
+            summary += f", {self.evicted} older thumbnails evicted to make room"
+
+        if result:
+            message, level = f"Pre-thumbnail {self.layer_name}: {summary}", 3  # success
+        elif self.cache_full:
+            message, level = (
+                f"Pre-thumbnail {self.layer_name} stopped, the thumbnail cache is full and more thumbnails "
+                f"would evict the first ones. {summary}",
+                1,
+            )
+        elif self.exception is not None:
+            message, level = f"Pre-thumbnail {self.layer_name} failed, run it again to resume. {summary}", 2
+            QgsMessageLog.logMessage(f"Pre-thumbnail: Error: {repr(self.exception)}", "Images Viewer", level=2)
+        else:
+            message, level = f"Pre-thumbnail {self.layer_name} cancelled, run it again to resume. {summary}", 1
+        QgsMessageLog.logMessage(message, "Images Viewer", level=0)
+        self.iface.messageBar().pushMessage(message, level)
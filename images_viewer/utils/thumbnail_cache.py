@@ -0,0 +1,233 @@
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+
+from PIL import Image as PILImage
+from qgis.core import QgsApplication
+
+from images_viewer.utils.config import THUMBNAIL_DISK_CACHE_DIR, THUMBNAIL_DISK_CACHE_SIZE
+
+
+class ThumbnailDiskCache:
+    """
+    Persistent LRU cache of downscaled images shared between sessions.
+    Thumbnails are stored as files, an sqlite index keeps their fingerprint, size and last access time.
+    An entry is keyed by layer, field and feature, it is only valid as long as the fingerprint of the image source
+    (see ImageFactory.fingerprint) has not changed.
+    For urls the index also keeps the HTTP validators (ETag, Last-Modified) used to revalidate the entry.
+    Whether the image is a 360 image is kept too, thumbnails are saved without the metadata it was read from.
+    """
+
+    SCHEMA_VERSION = 2  # bump when the table changes, the cache is then emptied
+
+    def __init__(self, directory=None, capacity=THUMBNAIL_DISK_CACHE_SIZE):
+        """capacity is in bytes, the directory defaults to a folder in the QGIS profile"""
+        if directory is None:
+            directory = os.path.join(QgsApplication.qgisSettingsDirPath(), THUMBNAIL_DISK_CACHE_DIR)
+        os.makedirs(directory, exist_ok=True)
+
+        self._directory = directory
+        self._capacity = capacity
+        self._lock = threading.Lock()
+        self._written = 0  # bytes stored through this instance
+        self._evicted = 0  # entries evicted by this instance
+
+        # the connection is shared by the worker threads, access is serialized with self._lock
+        self._db = sqlite3.connect(os.path.join(directory, "index.sqlite"), timeout=30, check_same_thread=False)
+        with self._lock, self._db:
+            self._db.execute("PRAGMA journal_mode=WAL")  # other QGIS instances may use the same cache
+            if self._db.execute("PRAGMA user_version").fetchone()[0] != self.SCHEMA_VERSION:
+                self._db.execute("DROP TABLE IF EXISTS thumbnails")
+                self._db.execute(f"PRAGMA user_version = {self.SCHEMA_VERSION}")
+            self._db.execute(
+                """CREATE TABLE IF NOT EXISTS thumbnails (
+                    key TEXT PRIMARY KEY,
+                    fingerprint TEXT NOT NULL,
+                    filename TEXT NOT NULL,
+                    target_width INTEGER NOT NULL,
+                    target_height INTEGER NOT NULL,
+                    size INTEGER NOT NULL,
+                    last_access REAL NOT NULL,
+                    etag TEXT,
+                    last_modified TEXT,
+                    validated_at REAL NOT NULL,
+                    is_360 INTEGER
+                )"""
+            )
+            self._db.execute("CREATE INDEX IF NOT EXISTS thumbnails_last_access ON thumbnails (last_access)")
+            self._usage = self._db.execute("SELECT COALESCE(SUM(size), 0) FROM thumbnails").fetchone()[0]
+
+    @staticmethod
+    def key(layer_id, field, f_id) -> str:
+        return hashlib.sha1(f"{layer_id}\0{field}\0{f_id}".encode("utf-8")).hexdigest()
+
+    def get(self, key, fingerprint, target_size):
+        """
+        Returns the cached thumbnail as a loaded PIL Image or None on a miss.
+        A thumbnail made for a smaller target_size than the requested one is a miss.
+        """
+        with self._lock:
+            row = self._db.execute(
+                "SELECT fingerprint, filename, target_width, target_height, is_360 FROM thumbnails WHERE key = ?",
+                (key,),
+            ).fetchone()
+            if not row:
+                return None
+            cached_fingerprint, filename, target_width, target_height, is_360 = row
+            if cached_fingerprint != fingerprint or target_width < target_size[0] or target_height < target_size[1]:
+                return None
+            with self._db:
+                self._db.execute("UPDATE thumbnails SET last_access = ? WHERE key = ?", (time.time(), key))
+
+        try:
+            image = PILImage.open(os.path.join(self._directory, filename))
+            image.load()  # read the pixels now, this also closes the file
+        except OSError:  # file was removed or is corrupt
+            self.remove(key)
+            return None
+
+        if is_360 is not None:
+            image.info["is_360"] = bool(is_360)
+        return image
+
+    def contains(self, key, fingerprint, target_size) -> bool:
+        """True if get would be a hit, without reading the thumbnail. The entry counts as used"""
+        with self._lock:
+            row = self._db.execute(
+                "SELECT fingerprint, target_width, target_height FROM thumbnails WHERE key = ?", (key,)
+            ).fetchone()
+            if not row or row[0] != fingerprint or row[1] < target_size[0] or row[2] < target_size[1]:
+                return False
+            with self._db:
+                self._db.execute("UPDATE thumbnails SET last_access = ? WHERE key = ?", (time.time(), key))
+            return True
+
+    def validators(self, key):
+        """Returns (etag, last_modified, validated_at) of the entry, validated_at is 0 for a missing entry"""
+        with self._lock:
+            row = self._db.execute(
+                "SELECT etag, last_modified, validated_at FROM thumbnails WHERE key = ?", (key,)
+            ).fetchone()
+        return row if row else (None, None, 0)
+
+    def revalidated(self, key):
+        """The source confirmed the entry is still up to date"""
+        with self._lock, self._db:
+            self._db.execute("UPDATE thumbnails SET validated_at = ? WHERE key = ?", (time.time(), key))
+
+    def put(self, key, fingerprint, target_size, image, etag=None, last_modified=None) -> bool:
+        """Store the thumbnail, returns False if the image could not be stored"""
+        filename = f"{key}.jpg" if image.mode in ("RGB", "L", "CMYK") else f"{key}.png"
+        path = os.path.join(self._directory, filename)
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+
+        try:
+            if filename.endswith(".jpg"):
+                image.save(tmp_path, "JPEG", quality=90)
+            else:
+                image.save(tmp_path, "PNG")
+            os.replace(tmp_path, path)  # atomic, a reader never sees a half written file
+            size = os.path.getsize(path)
+        except (OSError, ValueError, KeyError):  # e.g. a mode that can't be saved as JPEG/PNG
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            return False
+
+        with self._lock:
+            row = self._db.execute("SELECT filename, size FROM thumbnails WHERE key = ?", (key,)).fetchone()
+            with self._db:
+                now = time.time()
+                is_360 = image.info.get("is_360")
+                self._db.execute(
+                    "INSERT OR REPLACE INTO thumbnails VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    (
+                        key,
+                        fingerprint,
+                        filename,
+                        target_size[0],
+                        target_size[1],
+                        size,
+                        now,
+                        etag,
+                        last_modified,
+                        now,
+                        None if is_360 is None else int(is_360),
+                    ),
+                )
+            if row:
+                self._usage -= row[1]
+                if row[0] != filename:
+                    self._remove_file(row[0])
+            self._usage += size
+            self._written += size
+
+            if self._usage > self._capacity:
+                self._evict()
+
+        return True
+
+    def remove(self, key):
+        with self._lock:
+            row = self._db.execute("SELECT filename, size FROM thumbnails WHERE key = ?", (key,)).fetchone()
+            if not row:
+                return
+            with self._db:
+                self._db.execute("DELETE FROM thumbnails WHERE key = ?", (key,))
+            self._usage -= row[1]
+            self._remove_file(row[0])
+
+    def clear(self):
+        with self._lock:
+            for (filename,) in self._db.execute("SELECT filename FROM thumbnails").fetchall():
+                self._remove_file(filename)
+            with self._db:
+                self._db.execute("DELETE FROM thumbnails")
+            self._usage = 0
+
+    def usage(self) -> int:
+        """Bytes used by the thumbnails on disk"""
+        with self._lock:
+            return self._usage
+
+    def capacity(self) -> int:
+        return self._capacity
+
+    def written(self) -> int:
+        """Bytes of the thumbnails stored through this instance, whether they are still cached or not"""
+        with self._lock:
+            return self._written
+
+    def evicted(self) -> int:
+        """Number of thumbnails this instance evicted to stay under capacity"""
+        with self._lock:
+            return self._evicted
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+    def _evict(self):
+        """Remove least recently used thumbnails until usage is below 90% of capacity, call with self._lock held"""
+        # other processes may share the directory, start from the real usage
+        self._usage = self._db.execute("SELECT COALESCE(SUM(size), 0) FROM thumbnails").fetchone()[0]
+        target = self._capacity * 0.9  # leave some room so that we do not evict on every put
+        evicted = []
+        for key, filename, size in self._db.execute(
+            "SELECT key, filename, size FROM thumbnails ORDER BY last_access"
+        ).fetchall():
+            if self._usage <= target:
+                break
+            evicted.append((key,))
+            self._remove_file(filename)
+            self._usage -= size
+        with self._db:
+            self._db.executemany("DELETE FROM thumbnails WHERE key = ?", evicted)
+        self._evicted += len(evicted)
+
+    def _remove_file(self, filename):
+        try:
+            os.remove(os.path.join(self._directory, filename))
+        except OSError:
+            pass
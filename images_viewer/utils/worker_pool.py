@@ -0,0 +1,106 @@
+from PyQt5.QtCore import QObject, QRunnable, QThreadPool, pyqtSignal, pyqtSlot
+
+from images_viewer.utils.config import WORKER_POOL_THREADS
+
+# QThreadPool runs queued tasks with higher priority first
+VISIBLE_PRIORITY = 2  # work needed by what the user is looking at
+CHILDREN_PRIORITY = 1  # child images of frames on the page
+SPECULATIVE_PRIORITY = 0  # prefetching
+
+
+class Worker(QObject):
+    """
+    Base class of the background workers run by a WorkerPool.
+    Subclasses implement run() and return early once self.abandon is set.
+    finished is emitted when run returns, or right away if the worker is cancelled before it started.
+    """
+
+    finished = pyqtSignal()
+
+    def __init__(self):
+        super().__init__()
+        self.abandon = False
+
+    def run(self):
+        raise NotImplementedError
+
+    @pyqtSlot()
+    def stop(self):
+        """Slot to stop the worker's operation safely."""
+        self.abandon = True
+
+
+class WorkerRunnable(QRunnable):
+    def __init__(self, worker: Worker):
+        super().__init__()
+        self.worker = worker
+        self.done = False  # the worker may be deleted once it is done, it must not be touched anymore
+        self.setAutoDelete(False)  # python keeps the reference, see WorkerPool.start
+
+    def run(self):
+        try:
+            if not self.worker.abandon:
+                self.worker.run()
+        finally:
+            self.done = True
+            self.worker.finished.emit()
+
+
+class TaskHandle:
+    """Handle on a worker started by a WorkerPool"""
+
+    def __init__(self, pool: QThreadPool, runnable: WorkerRunnable):
+        self._pool = pool
+        self._runnable = runnable
+
+    @property
+    def worker(self) -> Worker:
+        return self._runnable.worker
+
+    @property
+    def done(self) -> bool:
+        """The worker returned or was cancelled before it started"""
+        return self._runnable.done
+
+    def cancel(self):
+        """Abandon the worker, if it has not started yet it is removed from the queue and never runs"""
+        if self._runnable.done:
+            return
+        self.worker.stop()
+        if self._pool.tryTake(self._runnable):
+            self._runnable.done = True
+            self.worker.finished.emit()
+
+
+class WorkerPool(QObject):
+    """
+    Long lived pool of threads running Workers, replaces a QThread per task.
+    The number of concurrent workers is bounded, extra workers wait in a priority queue.
+    """
+
+    def __init__(self, max_threads=WORKER_POOL_THREADS):
+        super().__init__()
+        self._pool = QThreadPool()  # not the global pool, QGIS uses that one for rendering
+        self._pool.setMaxThreadCount(max_threads)
+        self._runnables = set()  # keep references until the workers are done
+
+    def start(self, worker: Worker, priority=VISIBLE_PRIORITY) -> TaskHandle:
+        runnable = WorkerRunnable(worker)
+        self._runnables.add(runnable)
+        worker.finished.connect(lambda: self._runnables.discard(runnable))
+        self._pool.start(runnable, priority)
+        return TaskHandle(self._pool, runnable)
+
+    def shutdown(self):
+        """
+        Abandon every worker, including those started by frames the dialog does not track.
+        Queued workers are removed and never run, running ones return at their next check.
+        """
+        for runnable in list(self._runnables):
+            TaskHandle(self._pool, runnable).cancel()
+
+    def activeThreadCount(self) -> int:
+        return self._pool.activeThreadCount()
+
+    def waitForDone(self, msecs=-1) -> bool:
+        return self._pool.waitForDone(msecs)
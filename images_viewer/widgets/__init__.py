@@ -4,3 +4,4 @@ Images Viewer Widget Module
 
 from .image360_widget import Image360Widget
 from .image_widget import ImageWidget
+from .texture import Texture
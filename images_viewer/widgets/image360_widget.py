@@ -1,17 +1,28 @@
+import math
+from functools import partial
+
 import OpenGL.GL as GL
 import OpenGL.GLU as GLU
 from PyQt5 import QtCore
-from PyQt5.QtOpenGL import QGLWidget
+from PyQt5.QtGui import QMatrix4x4, QSurfaceFormat
+from qgis.PyQt import sip
+from qgis.PyQt.QtWidgets import QOpenGLWidget
+
+from images_viewer.widgets.sphere_mesh import SphereMesh
+from images_viewer.widgets.texture import Texture
 
 
-class Image360Widget(QGLWidget):
+class Image360Widget(QOpenGLWidget):
     """
-    The Image360Widget class inherits from QGLWidget and is initialized using an Image object.
+    The Image360Widget class inherits from QOpenGLWidget and is initialized using an Image object.
     It overwrites the initializeGL, paintGL, and resizeGL methods.
     """
 
-    def __init__(self, image):
+    def __init__(self, image, full_image_loader=None):
         super().__init__()
+        surface_format = QSurfaceFormat()
+        surface_format.setDepthBufferSize(24)  # QGLWidget had a depth buffer by default, QOpenGLWidget does not
+        self.setFormat(surface_format)
         self.x = 0
         self.y = 0
         self.prev_dx = 0
@@ -21,6 +32,15 @@ class Image360Widget(QGLWidget):
         self.inertia_timer.setInterval(16)
         self.image = image
         self.image_width, self.image_height = self.image.size
+        # the texture is uploaded when the widget is painted and released when it is hidden or destroyed
+        self.texture = Texture()
+        self.texture_dirty = True
+        self.sphere_mesh = None  # shared with the other 360 widgets, see SphereMesh
+        # full_image_loader(on_ready, box) loads the image reduced to fit in box in the background and calls
+        # on_ready with it, used when the user zooms in past the resolution of self.image
+        self.full_image_loader = full_image_loader
+        self.generation = 0  # bumped when the widget shows another image, a late sharper image is then dropped
+        self.requested_box = None  # box of the last sharper image asked for
         self.yaw = 90 - (0 - ((450) % 360))
         self.pitch = 0
         self.prev_dx = 0
@@ -38,58 +58,133 @@ class Image360Widget(QGLWidget):
         """
         GL.glClearColor(1.0, 1.0, 1.0, 1.0)  # Clear color buffer and set it color to white
         GL.glEnable(GL.GL_TEXTURE_2D)  # Enable the 2D texturing
-        self.texture = GL.glGenTextures(1)  # Generate the texture ID
-        GL.glBindTexture(GL.GL_TEXTURE_2D, self.texture)  # Binds the texture ID above to a 2D texture target
-        if self.image.mode == "RGBA":
-            GL.glTexImage2D(
-                GL.GL_TEXTURE_2D,
-                0,
-                GL.GL_RGBA,
-                self.image_width,
-                self.image_height,
-                0,
-                GL.GL_RGBA,
-                GL.GL_UNSIGNED_BYTE,
-                self.image.tobytes(),
-            )
-        elif self.image.mode == "RGB":
-            GL.glTexImage2D(
-                GL.GL_TEXTURE_2D,
-                0,
-                GL.GL_RGB,
-                self.image_width,
-                self.image_height,
-                0,
-                GL.GL_RGB,
-                GL.GL_UNSIGNED_BYTE,
-                self.image.tobytes(),
-            )  # Upload the image data to the GPU
-        GL.glTexParameteri(
-            GL.GL_TEXTURE_2D, GL.GL_TEXTURE_MAG_FILTER, GL.GL_LINEAR
-        )  # Set the texture's magnification filter to linear filtering
-        GL.glTexParameteri(
-            GL.GL_TEXTURE_2D, GL.GL_TEXTURE_MIN_FILTER, GL.GL_LINEAR
-        )  # Set the texture's minification filter to linear filtering
-        self.sphere = GLU.gluNewQuadric()  # Creates a new quadric to draw a sphere
-        GL.glMatrixMode(GL.GL_PROJECTION)  # Set up the projection matrix to project image to the sphere
-        GL.glLoadIdentity()
-        GLU.gluPerspective(90, self.width() / self.height(), 0.1, 1000)
+        self.sphere_mesh = SphereMesh.acquire()  # built by the first 360 widget, reused by the others
         GL.glMatrixMode(GL.GL_MODELVIEW)
         GL.glLoadIdentity()
+        # the context goes away with the widget (deleteLater) or when it is reparented, free GL resources first
+        self.context().aboutToBeDestroyed.connect(self.releaseGL)
+
+    def uploadTexture(self):
+        """
+        Uploads self.image, must be called with the GL context current
+        """
+        self.texture.upload(self.image)
+        self.texture_dirty = False
+
+    def textureBox(self):
+        """
+        Panorama size showing the view at screen resolution: the viewport height covers fov degrees of the
+        180 degrees of the panorama's height, rounded up to a power of two so that zooming does not load every notch
+        """
+        height = self.height() * self.devicePixelRatioF() * 180 / self.fov
+        height = 2 ** math.ceil(math.log2(max(height, 1)))
+        return (height * 2, height)
+
+    def needsSharperImage(self) -> bool:
+        """
+        True if the view needs more pixels than self.image has and they have not been asked for yet
+        """
+        if not self.full_image_loader:
+            return False
+        box = self.textureBox()
+        if self.image_width >= box[0] or self.image_height >= box[1]:
+            return False
+        return self.requested_box is None or box[0] > self.requested_box[0]
+
+    def releaseTexture(self):
+        """
+        Frees the texture, it is uploaded again the next time the widget is painted
+        """
+        if not self.texture.id:
+            return
+        self.makeCurrent()
+        self.texture.release()
+        self.doneCurrent()
+        self.texture_dirty = True
+
+    def releaseGL(self):
+        """
+        Frees the texture and lets go of the shared sphere, called before the context is destroyed
+        """
+        self.makeCurrent()
+        self.texture.release()
+        self.texture_dirty = True
+        if self.sphere_mesh:
+            self.sphere_mesh.release()
+            self.sphere_mesh = None
+        self.doneCurrent()
+
+    def hideEvent(self, event):
+        """
+        Hidden frames wait in the cache, they do not need to hold a texture
+        """
+        self.inertia_timer.stop()
+        self.releaseTexture()
+        super().hideEvent(event)
+
+    def loadFullImage(self):
+        """
+        Asks for a panorama at the resolution of the view, the current one is shown until it arrives in setFullImage
+        """
+        self.requested_box = self.textureBox()
+        self.full_image_loader(partial(self.setFullImage, self.generation, self.requested_box), self.requested_box)
+
+    def setFullImage(self, generation, box, image):
+        """
+        Swaps in the sharper panorama, the texture is re-uploaded on next paint
+        """
+        if sip.isdeleted(self) or generation != self.generation:
+            return
+        if image is None:  # could not be loaded, do not try again
+            self.full_image_loader = None
+            return
+        if image.width <= self.image_width:  # a sharper panorama arrived first
+            return
+        if image.width < box[0] and image.height < box[1]:  # the source (or the texture size) has no more pixels
+            self.full_image_loader = None
+        self.image = image
+        self.image_width, self.image_height = self.image.size
+        self.texture_dirty = True
+        self.update()
+
+    def setImage(self, image, full_image_loader=None):
+        """
+        Shows another panorama in this widget from the initial view, the texture is reused and re-uploaded on next paint
+        """
+        self.inertia_timer.stop()
+        self.image = image
+        self.image_width, self.image_height = self.image.size
+        self.full_image_loader = full_image_loader
+        self.generation += 1
+        self.requested_box = None
+        self.yaw = 90 - (0 - ((450) % 360))
+        self.pitch = 0
+        self.fov = 60
+        self.moving = False
+        self.texture_dirty = True
+        self.update()
+
+    def memoryUsage(self) -> int:
+        """Estimated bytes held by the widget: the decoded image kept for re-uploads plus its texture if resident"""
+        return self.image_width * self.image_height * 4 + self.texture.bytes
 
     def paintGL(self):
         """
         Renders the texture
         """
+        if self.texture_dirty:
+            self.uploadTexture()  # first paint, new image or full resolution image loaded
+        self.texture.bind()
         GL.glClear(GL.GL_COLOR_BUFFER_BIT | GL.GL_DEPTH_BUFFER_BIT)
-        GL.glPushMatrix()
-        GL.glRotatef(self.pitch, 1, 0, 0)  # Rotating the model around axes
-        GL.glRotatef(self.yaw, 0, 1, 0)
-        GL.glRotatef(90, 1, 0, 0)
-        GL.glRotatef(90, 0, 0, 1)
-        GLU.gluQuadricTexture(self.sphere, True)  # Enable texturing for the sphere
-        GLU.gluSphere(self.sphere, 1, 100, 100)  # Draw the sphere
-        GL.glPopMatrix()
+
+        # only the matrix changes between frames, the sphere is in GPU buffers
+        mvp = QMatrix4x4()
+        mvp.perspective(self.fov, self.width() / self.height(), 0.1, 1000)
+        mvp.rotate(self.pitch, 1, 0, 0)  # Rotating the model around axes
+        mvp.rotate(self.yaw, 0, 1, 0)
+        mvp.rotate(90, 1, 0, 0)
+        mvp.rotate(90, 0, 0, 1)
+        self.sphere_mesh.draw(mvp)
 
         # Crosshair
         GL.glMatrixMode(GL.GL_PROJECTION)
@@ -128,10 +223,7 @@ class Image360Widget(QGLWidget):
         """
         Logic for when the window is resized
         """
-        GL.glViewport(0, 0, width, height)
-        GL.glMatrixMode(GL.GL_PROJECTION)
-        GL.glLoadIdentity()
-        GLU.gluPerspective(self.fov, self.width() / self.height(), 0.1, 1000)  # Perspective projection with new aspect
+        GL.glViewport(0, 0, width, height)  # the perspective projection with the new aspect is set in paintGL
 
     def mousePressEvent(self, event):
         if event.button() == QtCore.Qt.LeftButton:
@@ -173,9 +265,8 @@ class Image360Widget(QGLWidget):
         delta = event.angleDelta().y()
         self.fov -= delta * 0.1
         self.fov = max(30, min(self.fov, 90))
-        GL.glMatrixMode(GL.GL_PROJECTION)
-        GL.glLoadIdentity()
-        GLU.gluPerspective(self.fov, self.width() / self.height(), 0.1, 1000)
+        if delta > 0 and self.needsSharperImage():
+            self.loadFullImage()
         self.update()
 
     def apply_inertia(self):
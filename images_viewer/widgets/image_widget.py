@@ -1,54 +1,124 @@
+from functools import partial
+
 from OpenGL.GL import *
+from qgis.PyQt import sip
+from qgis.PyQt.QtCore import Qt
 from qgis.PyQt.QtWidgets import QOpenGLWidget
 
+from images_viewer.widgets.texture import Texture, zoom_level
+
 
 class ImageWidget(QOpenGLWidget):
     """Open GL widget to display static images."""
 
-    def __init__(self, image):
+    MAX_ZOOM = 8.0
+
+    def __init__(self, image, full_image_loader=None):
         super().__init__()
         self.image = image
         self.image_width, self.image_height = self.image.size
-        self.texture_id = 0
+        # the texture is uploaded when the widget is painted and released when it is hidden or destroyed
+        self.texture = Texture()
+        self.texture_dirty = True
+
+        # full_image_loader(on_ready, box) loads the image reduced to fit in box in the background and calls
+        # on_ready with it, used when the user zooms in past the resolution of self.image
+        self.full_image_loader = full_image_loader
+        self.generation = 0  # bumped when the widget shows another image, a late sharper image is then dropped
+        self.requested_box = None  # box of the last sharper image asked for
+
+        self.zoom = 1.0
+        self.pan_x = 0.0  # in normalized device coordinates
+        self.pan_y = 0.0
+        self.mouse_x = 0
+        self.mouse_y = 0
+        self.is_mouse_pressed = False
 
     def initializeGL(self):
         glEnable(GL_TEXTURE_2D)
         glEnable(GL_BLEND)
         glBlendFunc(GL_SRC_ALPHA, GL_ONE_MINUS_SRC_ALPHA)
         glClearColor(1.0, 1.0, 1.0, 1.0)
-        self.texture_id = glGenTextures(1)  # Create an OpenGL texture
-        glBindTexture(GL_TEXTURE_2D, self.texture_id)
-        glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_MIN_FILTER, GL_LINEAR)
-        glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_MAG_FILTER, GL_LINEAR)
-        if self.image.mode == "RGBA":
-            glTexImage2D(
-                GL_TEXTURE_2D,
-                0,
-                GL_RGBA,
-                self.image_width,
-                self.image_height,
-                0,
-                GL_RGBA,
-                GL_UNSIGNED_BYTE,
-                self.image.tobytes(),
-            )
-        elif self.image.mode == "RGB":
-            glPixelStorei(GL_UNPACK_ALIGNMENT, 1)  # Default alignment is 4, each pixel is 3 bytes so pad 1 byte
-            glTexImage2D(
-                GL_TEXTURE_2D,
-                0,
-                GL_RGB,
-                self.image_width,
-                self.image_height,
-                0,
-                GL_RGB,
-                GL_UNSIGNED_BYTE,
-                self.image.tobytes(),
-            )  # Upload the image data to the texture
+        # the context goes away with the widget (deleteLater) or when it is reparented, free the texture first
+        self.context().aboutToBeDestroyed.connect(self.releaseTexture)
+
+    def uploadTexture(self):
+        """Upload self.image, must be called with the GL context current"""
+        self.texture.upload(self.image)
+        self.texture_dirty = False
+
+    def textureBox(self):
+        """Pixels the image is drawn in, at the next zoom step so that zooming in does not load on every notch"""
+        scale = self.devicePixelRatioF() * zoom_level(self.zoom)
+        return (round(self.width() * scale), round(self.height() * scale))
+
+    def needsSharperImage(self) -> bool:
+        """True if the view needs more pixels than self.image has and they have not been asked for yet"""
+        if not self.full_image_loader:
+            return False
+        box = self.textureBox()
+        if self.image_width >= box[0] or self.image_height >= box[1]:  # the image is fitted, one side is enough
+            return False
+        return self.requested_box is None or box[0] > self.requested_box[0] or box[1] > self.requested_box[1]
+
+    def releaseTexture(self):
+        """Free the texture, it is uploaded again the next time the widget is painted"""
+        if not self.texture.id:
+            return
+        self.makeCurrent()
+        self.texture.release()
+        self.doneCurrent()
+        self.texture_dirty = True
+
+    def hideEvent(self, event):
+        """Hidden frames wait in the cache, they do not need to hold a texture"""
+        self.releaseTexture()
+        super().hideEvent(event)
+
+    def loadFullImage(self):
+        """Ask for an image at the resolution of the view, the current one is shown until it arrives in setFullImage"""
+        self.requested_box = self.textureBox()
+        self.full_image_loader(partial(self.setFullImage, self.generation, self.requested_box), self.requested_box)
+
+    def setFullImage(self, generation, box, image):
+        """Swap in the sharper image, the texture is re-uploaded on next paint"""
+        if sip.isdeleted(self) or generation != self.generation:
+            return
+        if image is None:  # could not be loaded, do not try again
+            self.full_image_loader = None
+            return
+        if image.width <= self.image_width:  # a sharper image arrived first
+            return
+        if image.width < box[0] and image.height < box[1]:  # the source (or the texture size) has no more pixels
+            self.full_image_loader = None
+        self.image = image
+        self.image_width, self.image_height = self.image.size
+        self.texture_dirty = True
+        self.update()
+
+    def setImage(self, image, full_image_loader=None):
+        """Show another image in this widget, the texture is reused and re-uploaded on next paint"""
+        self.image = image
+        self.image_width, self.image_height = self.image.size
+        self.full_image_loader = full_image_loader
+        self.generation += 1
+        self.requested_box = None
+        self.zoom = 1.0
+        self.pan_x = 0.0
+        self.pan_y = 0.0
+        self.texture_dirty = True
+        self.update()
+
+    def memoryUsage(self) -> int:
+        """Estimated bytes held by the widget: the decoded image kept for re-uploads plus its texture if resident"""
+        return self.image_width * self.image_height * 4 + self.texture.bytes
 
     def paintGL(self):
+        if self.texture_dirty:
+            self.uploadTexture()  # first paint, new image or full resolution image loaded
+
         glClear(GL_COLOR_BUFFER_BIT)
-        glBindTexture(GL_TEXTURE_2D, self.texture_id)
+        self.texture.bind()
 
         texture_aspect_ratio = float(self.image_width) / float(self.image_height)
         viewport_aspect_ratio = float(self.width()) / float(self.height())
@@ -63,10 +133,17 @@ class ImageWidget(QOpenGLWidget):
             quad_height = 2.0
             quad_width = (self.height() * texture_aspect_ratio) / self.width() * 2.0
 
-        quad_left = -quad_width / 2.0
-        quad_right = quad_width / 2.0
-        quad_bottom = -quad_height / 2.0
-        quad_top = quad_height / 2.0
+        quad_width *= self.zoom
+        quad_height *= self.zoom
+
+        # do not let the image be dragged out of the viewport
+        self.pan_x = min(max(self.pan_x, -max(0.0, quad_width / 2.0 - 1.0)), max(0.0, quad_width / 2.0 - 1.0))
+        self.pan_y = min(max(self.pan_y, -max(0.0, quad_height / 2.0 - 1.0)), max(0.0, quad_height / 2.0 - 1.0))
+
+        quad_left = -quad_width / 2.0 + self.pan_x
+        quad_right = quad_width / 2.0 + self.pan_x
+        quad_bottom = -quad_height / 2.0 + self.pan_y
+        quad_top = quad_height / 2.0 + self.pan_y
 
         # Set up the textured quad with adjusted vertex positions
         glBegin(GL_QUADS)
@@ -82,3 +159,32 @@ class ImageWidget(QOpenGLWidget):
 
     def resizeGL(self, width, height):
         glViewport(0, 0, width, height)
+
+    def wheelEvent(self, event):
+        """Zoom in and out of the image, a sharper image is loaded when zooming in past the resolution of this one"""
+        event.accept()  # Consume the event here to prevent propagation
+        delta = event.angleDelta().y()
+        self.zoom *= 1.25 ** (delta / 120)
+        self.zoom = max(1.0, min(self.zoom, self.MAX_ZOOM))
+        if self.needsSharperImage():
+            self.loadFullImage()
+        self.update()
+
+    def mousePressEvent(self, event):
+        if event.button() == Qt.LeftButton and self.zoom > 1.0:
+            self.mouse_x, self.mouse_y = event.pos().x(), event.pos().y()
+            self.setCursor(Qt.ClosedHandCursor)
+            self.is_mouse_pressed = True
+
+    def mouseReleaseEvent(self, event):
+        if event.button() == Qt.LeftButton:
+            self.unsetCursor()
+            self.is_mouse_pressed = False
+
+    def mouseMoveEvent(self, event):
+        """Pan the zoomed image"""
+        if self.is_mouse_pressed:
+            self.pan_x += (event.pos().x() - self.mouse_x) / self.width() * 2.0
+            self.pan_y -= (event.pos().y() - self.mouse_y) / self.height() * 2.0
+            self.mouse_x, self.mouse_y = event.pos().x(), event.pos().y()
+            self.update()
@@ -0,0 +1,121 @@
+import math
+from array import array
+
+import OpenGL.GL as GL
+from PyQt5.QtGui import QOpenGLBuffer, QOpenGLContext, QOpenGLShader, QOpenGLShaderProgram
+
+VERTEX_SHADER = """
+attribute vec3 position;
+attribute vec2 tex_coord;
+uniform mat4 mvp;
+varying vec2 v_tex_coord;
+void main() {
+    v_tex_coord = tex_coord;
+    gl_Position = mvp * vec4(position, 1.0);
+}
+"""
+
+FRAGMENT_SHADER = """
+uniform sampler2D image;
+varying vec2 v_tex_coord;
+void main() {
+    gl_FragColor = texture2D(image, v_tex_coord);
+}
+"""
+
+
+class SphereMesh:
+    """
+    Unit sphere in vertex and index buffers with the shader drawing a texture on it.
+    It is built once per group of sharing GL contexts (QGIS shares them between all widgets)
+    and used by every Image360Widget of that group, so only the matrix changes from frame to frame.
+    Vertices and texture coordinates match gluSphere, so panoramas are oriented as before.
+    """
+
+    SLICES = 100
+    STACKS = 100
+
+    _meshes = {}  # QOpenGLContextGroup: SphereMesh
+
+    @classmethod
+    def acquire(cls) -> "SphereMesh":
+        """The mesh of the current context's share group, built if needed. Pair with release"""
+        group = QOpenGLContext.currentContext().shareGroup()
+        mesh = cls._meshes.get(group)
+        if mesh is None:
+            mesh = cls._meshes[group] = SphereMesh(group)
+        mesh.users += 1
+        return mesh
+
+    def __init__(self, group):
+        self.group = group
+        self.users = 0
+
+        vertices = array("f")  # x, y, z, s, t
+        for stack in range(self.STACKS + 1):
+            rho = math.pi * stack / self.STACKS
+            for sector in range(self.SLICES + 1):
+                theta = 2 * math.pi * sector / self.SLICES if sector < self.SLICES else 0.0
+                vertices.extend(
+                    (
+                        -math.sin(theta) * math.sin(rho),
+                        math.cos(theta) * math.sin(rho),
+                        math.cos(rho),
+                        sector / self.SLICES,
+                        1 - stack / self.STACKS,
+                    )
+                )
+        indices = array("I")
+        row = self.SLICES + 1
+        for stack in range(self.STACKS):
+            for sector in range(self.SLICES):
+                first = stack * row + sector
+                indices.extend((first, first + row, first + 1, first + 1, first + row, first + row + 1))
+        self.index_count = len(indices)
+
+        self.vertex_buffer = QOpenGLBuffer(QOpenGLBuffer.VertexBuffer)
+        self.vertex_buffer.create()
+        self.vertex_buffer.bind()
+        self.vertex_buffer.allocate(vertices.tobytes(), len(vertices) * vertices.itemsize)
+        self.vertex_buffer.release()
+
+        self.index_buffer = QOpenGLBuffer(QOpenGLBuffer.IndexBuffer)
+        self.index_buffer.create()
+        self.index_buffer.bind()
+        self.index_buffer.allocate(indices.tobytes(), len(indices) * indices.itemsize)
+        self.index_buffer.release()
+
+        self.program = QOpenGLShaderProgram()
+        self.program.addShaderFromSourceCode(QOpenGLShader.Vertex, VERTEX_SHADER)
+        self.program.addShaderFromSourceCode(QOpenGLShader.Fragment, FRAGMENT_SHADER)
+        self.program.link()
+
+    def draw(self, mvp):
+        """Draw the sphere with the bound texture, mvp is the QMatrix4x4 model view projection"""
+        stride = 5 * 4
+        self.program.bind()
+        self.program.setUniformValue("mvp", mvp)
+        self.program.setUniformValue("image", 0)
+        self.vertex_buffer.bind()
+        self.index_buffer.bind()
+        # attribute arrays are per context, they are set on every draw instead of being kept in a VAO
+        self.program.enableAttributeArray("position")
+        self.program.enableAttributeArray("tex_coord")
+        self.program.setAttributeBuffer("position", GL.GL_FLOAT, 0, 3, stride)
+        self.program.setAttributeBuffer("tex_coord", GL.GL_FLOAT, 3 * 4, 2, stride)
+        GL.glDrawElements(GL.GL_TRIANGLES, self.index_count, GL.GL_UNSIGNED_INT, None)
+        self.program.disableAttributeArray("position")
+        self.program.disableAttributeArray("tex_coord")
+        self.index_buffer.release()
+        self.vertex_buffer.release()
+        self.program.release()
+
+    def release(self):
+        """A widget stopped using the mesh, the last one frees it. A context of the group must be current"""
+        self.users -= 1
+        if self.users > 0:
+            return
+        self.vertex_buffer.destroy()
+        self.index_buffer.destroy()
+        self.program.removeAllShaders()
+        self._meshes.pop(self.group, None)
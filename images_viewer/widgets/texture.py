@@ -0,0 +1,73 @@
+import math
+
+import OpenGL.GL as GL
+
+
+def zoom_level(zoom) -> int:
+    """Smallest power of two >= zoom, sharper images are only loaded at these steps"""
+    return 2 ** max(0, math.ceil(math.log2(max(zoom, 1.0)) - 1e-9))
+
+
+class Texture:
+    """
+    Mipmapped 2D texture of a PIL image owned by one GL widget.
+    The pixels prepared by the workers (ImageFactory.to_texture_pixels) are uploaded as they are,
+    mipmaps keep the image smooth when it is drawn smaller than that.
+    All methods must be called with the widget's context current.
+    Texture.resident_bytes sums the textures of all widgets, it is what the driver holds for the viewer.
+    """
+
+    resident_bytes = 0
+    max_size = 0  # GL_MAX_TEXTURE_SIZE, queried once a context is current
+
+    def __init__(self):
+        self.id = 0
+        self.bytes = 0
+        self.size = (0, 0)  # of the uploaded level 0
+
+    def upload(self, image):
+        """Create the texture if needed and upload image to it, the texture is left bound"""
+        if not Texture.max_size:
+            Texture.max_size = int(GL.glGetIntegerv(GL.GL_MAX_TEXTURE_SIZE))
+
+        # the buffer prepared by the worker is passed without a copy
+        pixels = image.info.get("texture_pixels")
+        if image.width > Texture.max_size or image.height > Texture.max_size:
+            # workers reduce full images to max_size once it is known, this only happens before that
+            image = image.copy()
+            image.thumbnail((Texture.max_size, Texture.max_size))
+            pixels = None
+        if pixels is None:
+            if image.mode != "RGBA":
+                image = image.convert("RGBA")
+            pixels = image.tobytes()
+
+        if not self.id:
+            self.id = GL.glGenTextures(1)
+        GL.glBindTexture(GL.GL_TEXTURE_2D, self.id)
+        GL.glTexParameteri(GL.GL_TEXTURE_2D, GL.GL_TEXTURE_MIN_FILTER, GL.GL_LINEAR_MIPMAP_LINEAR)
+        GL.glTexParameteri(GL.GL_TEXTURE_2D, GL.GL_TEXTURE_MAG_FILTER, GL.GL_LINEAR)
+        if not bool(GL.glGenerateMipmap):  # before GL 3.0 the driver builds the mipmaps on upload
+            GL.glTexParameteri(GL.GL_TEXTURE_2D, GL.GL_GENERATE_MIPMAP, GL.GL_TRUE)
+
+        width, height = image.size
+        GL.glTexImage2D(GL.GL_TEXTURE_2D, 0, GL.GL_RGBA, width, height, 0, GL.GL_RGBA, GL.GL_UNSIGNED_BYTE, pixels)
+        if bool(GL.glGenerateMipmap):
+            GL.glGenerateMipmap(GL.GL_TEXTURE_2D)
+        self.size = (width, height)
+        self._account(width * height * 4 * 4 // 3)  # mipmaps add a third
+
+    def bind(self):
+        GL.glBindTexture(GL.GL_TEXTURE_2D, self.id)
+
+    def release(self):
+        """Delete the texture, it can be uploaded again later"""
+        if self.id:
+            GL.glDeleteTextures([self.id])
+            self.id = 0
+        self.size = (0, 0)
+        self._account(0)
+
+    def _account(self, size):
+        Texture.resident_bytes += size - self.bytes
+        self.bytes = size
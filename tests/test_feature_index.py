@@ -0,0 +1,135 @@
+"""
+Feature id containers: merging streamed chunks into a FeatureIdIndex, moving page indexes to the merged list,
+and the bitmap of FeatureIdSet.
+The plugin's modules import qgis, run with the Python of QGIS from the repository root:
+python -m unittest discover tests
+"""
+
+import unittest
+
+from images_viewer.utils.feature_index import FeatureIdIndex, FeatureIdSet
+
+
+class TestFeatureIdIndex(unittest.TestCase):
+    def test_sorted_on_creation(self):
+        index = FeatureIdIndex([30, 10, 20])
+        self.assertEqual(list(index), [10, 20, 30])
+        self.assertIn(20, index)
+        self.assertNotIn(25, index)
+
+    def test_merged(self):
+        index = FeatureIdIndex([10, 20, 30, 40], is_sorted=True)
+        merged = index.merged([5, 25, 50])
+        self.assertEqual(list(merged), [5, 10, 20, 25, 30, 40, 50])
+        self.assertEqual(list(index), [10, 20, 30, 40])  # shared with the workers, not modified
+
+    def test_merged_chunks(self):
+        index = FeatureIdIndex([], is_sorted=True)
+        for chunk in ([3, 7], [1, 9], [5]):
+            index = index.merged(chunk)
+        self.assertEqual(list(index), [1, 3, 5, 7, 9])
+
+    def test_bisect(self):
+        index = FeatureIdIndex([10, 20, 30], is_sorted=True)
+        self.assertEqual(index.bisectLeft(20), 1)
+        self.assertEqual(index.bisectRight(20), 2)
+        self.assertEqual(index.bisectLeft(25), 2)
+        self.assertEqual(index.bisectRight(99), 3)
+
+    def test_patched(self):
+        index = FeatureIdIndex([10, 20, 30], is_sorted=True)
+        self.assertEqual(list(index.patched({20}, [15, 30, 40])), [10, 15, 30, 40])
+
+
+class TestReanchor(unittest.TestCase):
+    """Indexes of the page in the grid are moved to the same features when a chunk is merged"""
+
+    def setUp(self):
+        self.previous = FeatureIdIndex([10, 20, 30, 40], is_sorted=True)
+
+    def test_ids_inserted_after_the_page(self):
+        merged = self.previous.merged([50, 60])
+        self.assertEqual(merged.reanchor(self.previous, 1), 1)
+        self.assertEqual(merged.reanchor(self.previous, 3), 3)
+
+    def test_ids_inserted_before_the_page(self):
+        merged = self.previous.merged([1, 2])
+        self.assertEqual(merged.reanchor(self.previous, 0), 2)  # page_start still shows id 10
+        self.assertEqual(merged.reanchor(self.previous, 2), 4)  # next_page_start still at id 30
+
+    def test_ids_inserted_inside_the_page(self):
+        merged = self.previous.merged([25])
+        page_start = merged.reanchor(self.previous, 1)
+        next_page_start = merged.reanchor(self.previous, 3)
+        self.assertEqual((page_start, next_page_start), (1, 4))
+        self.assertNotEqual(next_page_start - page_start, 3 - 1)  # the dialog searches the page again
+
+    def test_past_the_end(self):
+        merged = self.previous.merged([5, 50])
+        # the last page ended with the list, the ids streamed after it belong to the next page
+        self.assertEqual(merged.reanchor(self.previous, 4), 5)
+        self.assertEqual(merged[5], 50)
+
+    def test_past_the_end_ids_inserted_before(self):
+        merged = self.previous.merged([1, 2, 3])
+        self.assertEqual(merged.reanchor(self.previous, 4), len(merged))
+
+
+class TestFeatureIdSet(unittest.TestCase):
+    def test_membership(self):
+        ids = FeatureIdSet(limit=64)
+        for f_id in (0, 9, 63):
+            ids.add(f_id)
+        self.assertIn(0, ids)
+        self.assertIn(9, ids)
+        self.assertIn(63, ids)
+        self.assertNotIn(8, ids)
+        self.assertNotIn(1000, ids)  # past the bitmap
+        self.assertEqual(len(ids), 3)
+
+    def test_bitmap_growth(self):
+        ids = FeatureIdSet(limit=64)
+        ids.add(0)
+        self.assertEqual(len(ids.bitmap), 1)
+        ids.add(9)
+        self.assertEqual(len(ids.bitmap), 2)
+        ids.add(40)
+        self.assertEqual(len(ids.bitmap), 6)
+        ids.add(63)
+        self.assertEqual(len(ids.bitmap), 8)  # never more than limit bits
+        self.assertEqual(list(f_id for f_id in range(64) if f_id in ids), [0, 9, 40, 63])
+
+    def test_ids_outside_of_the_bitmap(self):
+        ids = FeatureIdSet(limit=64)
+        ids.add(-1)  # feature not saved yet
+        ids.add(64)
+        ids.add(10**12)
+        self.assertIn(-1, ids)
+        self.assertIn(64, ids)
+        self.assertIn(10**12, ids)
+        self.assertEqual(len(ids.bitmap), 0)
+        self.assertEqual(ids.others, {-1, 64, 10**12})
+        self.assertEqual(len(ids), 3)
+
+    def test_count(self):
+        ids = FeatureIdSet(limit=64)
+        for f_id in (5, 5, -2, -2, 100, 100):
+            ids.add(f_id)
+        self.assertEqual(len(ids), 3)
+        for f_id in (5, -2, 100, 7, -9):  # discarding ids not in the set does not change the count
+            ids.discard(f_id)
+        self.assertEqual(len(ids), 0)
+        self.assertNotIn(5, ids)
+
+    def test_clear(self):
+        ids = FeatureIdSet(limit=64)
+        ids.add(3)
+        ids.add(-3)
+        ids.clear()
+        self.assertEqual(len(ids), 0)
+        self.assertNotIn(3, ids)
+        self.assertNotIn(-3, ids)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,173 @@
+"""
+Url images against a local HTTP server: downloads, conditional requests, retries and timeouts of HttpSession,
+and the revalidation of cached url thumbnails by ImageFactory.
+The plugin's modules import qgis, run with the Python of QGIS from the repository root:
+python -m unittest discover tests
+"""
+
+import io
+import tempfile
+import threading
+import time
+import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest import mock
+
+import requests
+from PIL import Image as PILImage
+
+from images_viewer.utils.http_session import HttpSession
+from images_viewer.utils.image_factory import ImageFactory
+from images_viewer.utils.thumbnail_cache import ThumbnailDiskCache
+
+
+def png_bytes(size=(64, 48)) -> bytes:
+    buffer = io.BytesIO()
+    PILImage.new("RGB", size, (200, 100, 50)).save(buffer, "PNG")
+    return buffer.getvalue()
+
+
+class ImageHandler(BaseHTTPRequestHandler):
+    """
+    /image answers 200 with an ETag, or 304 if the request has it. /flaky answers 503 to the first
+    server.failures requests, /busy answers 503 with a Retry-After of an hour once, /slow answers after 2 seconds.
+    """
+
+    def do_GET(self):
+        self.server.requests.append(self.path)
+        if self.path == "/image":
+            if self.headers.get("If-None-Match") == '"v1"':
+                self._send(304)
+            else:
+                headers = {"ETag": '"v1"', "Last-Modified": "Mon, 01 Jan 2024 00:00:00 GMT"}
+                self._send(200, self.server.content, headers)
+        elif self.path == "/flaky":
+            if self.server.requests.count("/flaky") <= self.server.failures:
+                self._send(503)
+            else:
+                self._send(200, self.server.content)
+        elif self.path == "/busy":
+            if self.server.requests.count("/busy") == 1:
+                self._send(503, headers={"Retry-After": "3600"})
+            else:
+                self._send(200, self.server.content)
+        elif self.path == "/slow":
+            time.sleep(2)
+            try:
+                self._send(200, self.server.content)
+            except ConnectionError:  # the client timed out and closed the connection
+                pass
+        else:
+            self._send(404)
+
+    def _send(self, status, content=b"", headers=None):
+        self.send_response(status)
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.send_header("Content-Length", str(len(content)))
+        self.end_headers()
+        self.wfile.write(content)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class ServerTestCase(unittest.TestCase):
+    def setUp(self):
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), ImageHandler)
+        self.server.daemon_threads = True
+        self.server.requests = []
+        self.server.failures = 2
+        self.server.content = png_bytes()
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.base_url = f"http://127.0.0.1:{self.server.server_address[1]}"
+
+    def tearDown(self):
+        self.stopServer()
+
+    def stopServer(self):
+        if self.server is not None:
+            self.server.shutdown()
+            self.server.server_close()
+            self.server = None
+
+
+class TestHttpSession(ServerTestCase):
+    def test_get(self):
+        response = HttpSession(backoff=0).get(f"{self.base_url}/image")
+        self.assertEqual(response.content, self.server.content)
+        self.assertEqual(response.etag, '"v1"')
+        self.assertEqual(response.last_modified, "Mon, 01 Jan 2024 00:00:00 GMT")
+        self.assertFalse(response.not_modified)
+
+    def test_not_modified(self):
+        response = HttpSession(backoff=0).get(f"{self.base_url}/image", '"v1"', "Mon, 01 Jan 2024 00:00:00 GMT")
+        self.assertTrue(response.not_modified)
+        self.assertEqual(response.etag, '"v1"')
+
+    def test_retry_on_server_error(self):
+        response = HttpSession(retries=3, backoff=0).get(f"{self.base_url}/flaky")
+        self.assertEqual(response.content, self.server.content)
+        self.assertEqual(self.server.requests.count("/flaky"), 3)
+
+    def test_give_up_after_retries(self):
+        self.server.failures = 10
+        with self.assertRaises(requests.RequestException):
+            HttpSession(retries=2, backoff=0).get(f"{self.base_url}/flaky")
+        self.assertEqual(self.server.requests.count("/flaky"), 3)
+
+    def test_retry_after_is_not_waited_for(self):
+        start = time.monotonic()
+        response = HttpSession(retries=1, backoff=0).get(f"{self.base_url}/busy")
+        self.assertEqual(response.content, self.server.content)
+        self.assertLess(time.monotonic() - start, 10)
+
+    def test_timeout(self):
+        start = time.monotonic()
+        with self.assertRaises(requests.RequestException):
+            HttpSession(timeout=0.2, retries=1, backoff=0).get(f"{self.base_url}/slow")
+        self.assertLess(time.monotonic() - start, 1.5)  # two attempts of 0.2 s, not the 2 s the server takes
+
+
+class TestUrlThumbnail(ServerTestCase):
+    def setUp(self):
+        super().setUp()
+        self.directory = tempfile.TemporaryDirectory()
+        self.disk_cache = ThumbnailDiskCache(self.directory.name)
+        self.url = f"{self.base_url}/image"
+        self.key = ThumbnailDiskCache.key("layer", "field", 1)
+        HttpSession.set_instance(HttpSession(timeout=1, retries=0, backoff=0))
+
+    def tearDown(self):
+        HttpSession.set_instance(None)
+        self.disk_cache.close()
+        self.directory.cleanup()
+        super().tearDown()
+
+    def test_download_then_cached(self):
+        data, downloaded = ImageFactory._cached_url_thumbnail(self.url, (32, 32), self.disk_cache, self.key)
+        self.assertTrue(downloaded)
+        self.assertEqual(data.size, (32, 24))
+        data, downloaded = ImageFactory._cached_url_thumbnail(self.url, (32, 32), self.disk_cache, self.key)
+        self.assertFalse(downloaded)
+        self.assertEqual(self.server.requests, ["/image"])
+
+    def test_revalidated(self):
+        ImageFactory._cached_url_thumbnail(self.url, (32, 32), self.disk_cache, self.key)
+        with mock.patch("images_viewer.utils.image_factory.IMAGE_URL_REVALIDATE_AGE", 0):
+            data, downloaded = ImageFactory._cached_url_thumbnail(self.url, (32, 32), self.disk_cache, self.key)
+        self.assertFalse(downloaded)
+        self.assertEqual(data.size, (32, 24))
+        self.assertEqual(self.server.requests, ["/image", "/image"])  # the second one answered 304
+
+    def test_stale_thumbnail_when_offline(self):
+        ImageFactory._cached_url_thumbnail(self.url, (32, 32), self.disk_cache, self.key)
+        self.stopServer()  # nothing listens on the url anymore
+        with mock.patch("images_viewer.utils.image_factory.IMAGE_URL_REVALIDATE_AGE", 0):
+            data, downloaded = ImageFactory._cached_url_thumbnail(self.url, (32, 32), self.disk_cache, self.key)
+        self.assertFalse(downloaded)
+        self.assertEqual(data.size, (32, 24))
+
+
+if __name__ == "__main__":
+    unittest.main()
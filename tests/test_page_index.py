@@ -0,0 +1,58 @@
+"""
+PageIndex: page starts learned while paging forward and the lookups the page spin box and jumps use.
+The plugin's modules import qgis, run with the Python of QGIS from the repository root:
+python -m unittest discover tests
+"""
+
+import unittest
+from array import array
+
+from images_viewer.utils.page_index import PageIndex
+
+
+class TestPageIndex(unittest.TestCase):
+    def test_new_index(self):
+        index = PageIndex()
+        self.assertEqual(index.pageCount(), 1)
+        self.assertEqual(index.pageStart(0), 0)
+        self.assertIsNone(index.pageStart(1))
+        self.assertFalse(index.complete)
+
+    def test_record(self):
+        index = PageIndex()
+        index.record(0, 12, 40)
+        index.record(12, 25, 40)
+        self.assertEqual(list(index.starts), [0, 12, 25])
+        self.assertFalse(index.complete)
+        index.record(25, 40, 40)  # the scan reached the end of the list
+        self.assertEqual(list(index.starts), [0, 12, 25])
+        self.assertTrue(index.complete)
+        index.record(25, 30, 40)
+        self.assertEqual(list(index.starts), [0, 12, 25])
+
+    def test_record_ignores_unknown_pages(self):
+        index = PageIndex()
+        index.record(5, 15, 40)  # not after the last known page, the page before it is unknown
+        index.record(0, 0, 40)  # empty scan
+        self.assertEqual(list(index.starts), [0])
+        index.record(0, 12, 40)
+        index.record(0, 12, 40)  # seen again
+        self.assertEqual(list(index.starts), [0, 12])
+
+    def test_page_number(self):
+        index = PageIndex(array("q", [0, 12, 25]))
+        self.assertEqual(index.pageNumber(0), 0)
+        self.assertEqual(index.pageNumber(25), 2)
+        self.assertIsNone(index.pageNumber(13))  # no page starts there
+        self.assertIsNone(index.pageNumber(99))
+
+    def test_page_of(self):
+        index = PageIndex(array("q", [0, 12, 25]))
+        self.assertEqual(index.pageOf(0), 0)
+        self.assertEqual(index.pageOf(11), 0)
+        self.assertEqual(index.pageOf(12), 1)
+        self.assertEqual(index.pageOf(30), 2)  # last known page
+
+
+if __name__ == "__main__":
+    unittest.main()